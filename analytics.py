@@ -0,0 +1,187 @@
+"""
+This module contains an analytics index over a stock series, answering range statistics (change, percentage
+change, high/low, VWAP and volatility) for any start and end date in constant time.
+"""
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+RangeStats = namedtuple('RangeStats', [
+    'start', 'end',  # the timestamps of the first and last rows in the range
+    'open', 'close',  # the first and last Close in the range
+    'change', 'percentage_change',
+    'high', 'low',
+    'vwap',  # volume weighted average of the typical price (High + Low + Close) / 3
+    'volatility'  # sample standard deviation of the log returns of Close within the range
+])
+
+
+def period_offset(time_period):
+    """
+    Converts a Google Finance time period (e.g. '14d', '3M' or '2Y') to a pandas DateOffset.
+
+    :param time_period: The time period
+    :return: pandas DateOffset of the same length
+    :raises ValueError: if the time period is not understood
+    """
+    units = {'d': 'days', 'M': 'months', 'Y': 'years'}
+    if len(time_period) < 2 or time_period[-1] not in units or not time_period[:-1].isdigit():
+        raise ValueError('invalid time period {0!r}'.format(time_period))
+    return pd.DateOffset(**{units[time_period[-1]]: int(time_period[:-1])})
+
+
+class SparseTable:
+    """
+    Sparse table answering the minimum or maximum of any range of an array in constant time.
+    """
+    def __init__(self, values, function):
+        """
+        Constructor for SparseTable.
+
+        :param values: 1D numpy array
+        :param function: np.minimum or np.maximum
+        """
+        self.function = function
+        self.levels = [np.asarray(values, dtype=float)]
+
+        # level k holds the result for each range of length 2^k
+        width = 1
+        while width * 2 <= len(values):
+            previous = self.levels[-1]
+            self.levels.append(function(previous[:-width], previous[width:]))
+            width *= 2
+
+    def query(self, i, j):
+        """
+        :param i: The first position of the range
+        :param j: The last position of the range (inclusive)
+        :return: The minimum or maximum of values[i:j + 1]
+        """
+        k = (j - i + 1).bit_length() - 1
+        level = self.levels[k]
+        return self.function(level[i], level[j - (1 << k) + 1])
+
+
+class AnalyticsIndex:
+    """
+    AnalyticsIndex is built once per series with prefix sums of the log returns and volume and sparse
+    tables of the highs and lows, so statistics of any date range are answered without rescanning the data.
+    """
+    def __init__(self, df):
+        """
+        Constructor for AnalyticsIndex.
+
+        :param df: A pandas DataFrame with Close, High, Low and Volume columns and a sorted DateTimeIndex
+        """
+        self.index = df.index
+        self.positions = df.index.values.astype('datetime64[ns]').astype(np.int64)
+
+        close = df.Close.values.astype(float)
+        high = df.High.values.astype(float)
+        low = df.Low.values.astype(float)
+        volume = df.Volume.values.astype(float)
+        self.close = close
+
+        # log returns between consecutive rows, with a leading 0 so position i holds the return into row i
+        log_returns = np.zeros(len(close))
+        if len(close) > 1:
+            log_returns[1:] = np.log(close[1:] / close[:-1])
+
+        # prefix sums, position i holds the sum of rows 0 to i - 1
+        self.sum_log_returns = self.prefix_sum(log_returns)
+        self.sum_squared_log_returns = self.prefix_sum(log_returns ** 2)
+        self.sum_volume = self.prefix_sum(volume)
+        self.sum_price_volume = self.prefix_sum((high + low + close) / 3 * volume)
+
+        self.highs = SparseTable(high, np.maximum)
+        self.lows = SparseTable(low, np.minimum)
+
+    @staticmethod
+    def prefix_sum(values):
+        """
+        :param values: 1D numpy array
+        :return: numpy array one longer than values where position i is the sum of values[:i]
+        """
+        sums = np.zeros(len(values) + 1)
+        np.cumsum(values, out=sums[1:])
+        return sums
+
+    def locate(self, start=None, end=None):
+        """
+        Finds the positions of the first and last rows between start and end.
+
+        :param start: The start date (inclusive), or None for the first row
+        :param end: The end date (inclusive), or None for the last row
+        :return: Tuple (i, j) of positions, or None if there are no rows in the range
+        """
+        i = 0 if start is None else int(self.positions.searchsorted(pd.Timestamp(start).value, side='left'))
+        j = len(self.positions) - 1 if end is None else \
+            int(self.positions.searchsorted(pd.Timestamp(end).value, side='right')) - 1
+        if i > j:
+            return None
+        return i, j
+
+    def stats(self, start=None, end=None):
+        """
+        Calculates the statistics of the rows between start and end.
+
+        :param start: The start date (inclusive), or None for the first row
+        :param end: The end date (inclusive), or None for the last row
+        :return: RangeStats of the range, or None if there are no rows in the range
+        """
+        located = self.locate(start, end)
+        if located is None:
+            return None
+        return self.range_stats(*located)
+
+    def range_stats(self, i, j):
+        """
+        Calculates the statistics of the rows at positions i to j.
+
+        :param i: The position of the first row
+        :param j: The position of the last row (inclusive)
+        :return: RangeStats of the range
+        """
+        open_price = self.close[i]
+        close_price = self.close[j]
+        change = close_price - open_price
+
+        volume = self.sum_volume[j + 1] - self.sum_volume[i]
+        vwap = (self.sum_price_volume[j + 1] - self.sum_price_volume[i]) / volume if volume else float('nan')
+
+        # the log returns within the range are those into rows i + 1 to j
+        n = j - i
+        if n > 1:
+            total = self.sum_log_returns[j + 1] - self.sum_log_returns[i + 1]
+            total_squared = self.sum_squared_log_returns[j + 1] - self.sum_squared_log_returns[i + 1]
+            volatility = np.sqrt(max(total_squared - total * total / n, 0) / (n - 1))
+        else:
+            volatility = float('nan')
+
+        return RangeStats(
+            start=self.index[i],
+            end=self.index[j],
+            open=open_price,
+            close=close_price,
+            change=change,
+            percentage_change=(float(change) / open_price) * 100,
+            high=self.highs.query(i, j),
+            low=self.lows.query(i, j),
+            vwap=vwap,
+            volatility=volatility
+        )
+
+    def period_stats(self, time_period, min_rows=2):
+        """
+        Calculates the statistics of the last time_period of the series, e.g. '1M' for the last month.
+
+        :param time_period: A Google Finance time period
+        :param min_rows: The minimum number of rows to include, so that e.g. a 3 day period over a weekend
+                         still has a change to show
+        :return: RangeStats of the period
+        """
+        end = self.index[-1]
+        i, j = self.locate(end - period_offset(time_period), end)
+        i = min(i, max(j - min_rows + 1, 0))
+        return self.range_stats(i, j)
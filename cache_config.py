@@ -0,0 +1,75 @@
+"""
+This module contains the configuration of the stock data cache and the time periods, shared by the application and
+the refresh daemon. It has no GUI imports, so the headless refresh daemon can use it without loading Qt.
+"""
+import os.path
+import threading
+
+from data_cache import CompressedFileSystemCache
+
+# the time periods that can be chosen, shortest first
+POSSIBLE_TIME_PERIODS = [
+    '3d', '4d', '5d', '6d',
+    '7d', '14d', '21d',
+    '1M', '2M', '3M', '4M', '5M', '6M', '7M', '8M', '9M', '10M', '11M',
+    '1Y', '2Y', '3Y', '4Y', '5Y', '6Y', '7Y'
+]
+
+# get the full path of the directory of the application
+app_root = os.path.abspath(os.path.dirname(__file__))
+
+# set up the cache directory as the subdirectory 'cache'
+CACHE_DIR = os.path.join(app_root, 'cache')
+
+# set the expiry of each object in the cache to 1 day (24 hrs) as this is what one datapoint of the datasets represents,
+# so the data won't be out of date for at least a day after
+EXPIRY_SECONDS = 24 * 60 * 60  # HOURS * MINUTES * SECONDS
+
+# the budget for the total size of the cache on disk, once exceeded the least recently used entries are removed.
+# about 36 KB per stock, so the default holds about 1,500 stocks (compaction trims to 80% of the budget), set the
+# STOCKS_CACHE_MAX_BYTES environment variable for larger watchlists
+MAX_CACHE_BYTES = int(os.environ.get('STOCKS_CACHE_MAX_BYTES', 64 * 1024 * 1024))  # 64 MiB
+
+# the one time period that is fetched and cached for every stock, all time periods are sliced from it, so the
+# application and the refresh daemon always use the same cache entries
+FETCH_PERIOD = POSSIBLE_TIME_PERIODS[-1]
+
+# the cache object of this process, created on first use by get_cache
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def create_cache(max_bytes=MAX_CACHE_BYTES):
+    """
+    Creates a new cache object with the cache directory, expiry, byte budget and compression codec.
+
+    :param max_bytes: The budget for the total size of the cache on disk
+    :return: CompressedFileSystemCache
+    """
+    return CompressedFileSystemCache(CACHE_DIR, default_timeout=EXPIRY_SECONDS, max_bytes=max_bytes, codec='zlib')
+
+
+def get_cache():
+    """
+    Gets the cache object shared by this process, creating it on first use (rather than at import, so that
+    processes which create their own, like the refresh daemon's workers, never start a compaction of it).
+
+    :return: CompressedFileSystemCache
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = create_cache()
+    return _cache
+
+
+def get_cache_key(code, index, time_period):
+    """
+    Builds the key in cache of the data for a stock over a time period.
+
+    :param code: The Google Finance code of the stock
+    :param index: The Google Finance index of the stock
+    :param time_period: The time period of the data
+    :return: String cache key
+    """
+    return "{0}:{1}.{2}".format(code, index, time_period)
@@ -0,0 +1,424 @@
+"""
+This module contains the file system cache used to store the downloaded stock data between runs.
+
+Each entry is stored in its own file as a small fixed header (format version, codec, expiry time, length and
+checksum) followed by the compressed entry. DataFrames are stored as raw little-endian arrays rather than
+pickles, so cached data does not depend on the installed pandas version. Any entry that is corrupt, truncated,
+expired or written by another format version is treated as a cache miss and removed.
+
+The total size of the cache directory is kept within a byte budget by a background compaction thread, which
+removes files that aren't valid entries (left over temporary files, files of older cache formats) and expired
+entries first and then the least recently used ones. The cache directory should not be shared with anything else.
+"""
+import hashlib
+import json
+import lzma
+import os
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+import profiling
+
+# the magic bytes and format version at the start of every cache file, bump FORMAT_VERSION when the layout changes
+MAGIC = b'SPDC'
+FORMAT_VERSION = 2  # 2: timestamps in the exchange's local time rather than the machine's
+
+# header layout: magic, format version, codec id, expiry (unix time, 0 = never), payload length, payload crc32
+HEADER = struct.Struct('>4sBBdQI')
+
+# the extension of cache files
+FILE_EXTENSION = '.spdc'
+
+# the extension of the temporary files entries are written to before being renamed into place
+TMP_EXTENSION = '.tmp'
+
+# temporary files older than this many seconds are left over from a crash (or killed process) and are removed
+STALE_TMP_SECONDS = 10 * 60
+
+# compaction removes entries until the cache is at or below this fraction of the byte budget
+COMPACTION_TARGET = 0.8
+
+Codec = namedtuple('Codec', ['codec_id', 'compress', 'decompress'])
+
+# the available compression codecs by name, extend with register_codec
+CODECS = {
+    'none': Codec(0, bytes, bytes),
+    'zlib': Codec(1, lambda data: zlib.compress(data, 6), zlib.decompress),
+    'lzma': Codec(2, lzma.compress, lzma.decompress),
+}
+
+
+def register_codec(name, codec_id, compress, decompress):
+    """
+    Registers a compression codec so that it can be used by CompressedFileSystemCache.
+
+    :param name: The name used to choose the codec
+    :param codec_id: A unique number (0-255) stored in each cache file to identify the codec
+    :param compress: Function taking bytes and returning the compressed bytes
+    :param decompress: Function taking compressed bytes and returning the original bytes
+    :return: None
+    """
+    if any(codec.codec_id == codec_id for codec in CODECS.values()):
+        raise ValueError('codec id {0} is already registered'.format(codec_id))
+    CODECS[name] = Codec(codec_id, compress, decompress)
+
+
+def encode_value(value):
+    """
+    Serializes a cache value to bytes without pickle.
+
+    DataFrames with a DateTimeIndex and numeric columns are stored as raw arrays, anything else must be
+    serializable as JSON.
+
+    :param value: The value to serialize
+    :return: bytes
+    """
+    if isinstance(value, pd.DataFrame):
+        meta = {
+            'kind': 'frame',
+            'rows': len(value),
+            'columns': [str(column) for column in value.columns],
+            'index_name': value.index.name
+        }
+        arrays = [value.index.values.astype('datetime64[ns]').astype('<i8').tobytes()]
+        arrays += [value[column].values.astype('<f8').tobytes() for column in value.columns]
+    else:
+        meta = {'kind': 'json', 'value': value}
+        arrays = []
+
+    meta_bytes = json.dumps(meta).encode('utf-8')
+    return struct.pack('>I', len(meta_bytes)) + meta_bytes + b''.join(arrays)
+
+
+def decode_value(data):
+    """
+    Deserializes bytes produced by encode_value.
+
+    :param data: The serialized bytes
+    :return: The original value
+    :raises ValueError: if the data is malformed
+    """
+    meta_length, = struct.unpack_from('>I', data)
+    meta = json.loads(data[4:4 + meta_length].decode('utf-8'))
+
+    if meta['kind'] == 'json':
+        return meta['value']
+
+    if meta['kind'] != 'frame':
+        raise ValueError('unknown cache value kind {0!r}'.format(meta['kind']))
+
+    rows = meta['rows']
+    if len(data) != 4 + meta_length + rows * 8 * (len(meta['columns']) + 1):
+        raise ValueError('cache value has the wrong length')
+
+    offset = 4 + meta_length
+    index = np.frombuffer(data, dtype='<i8', count=rows, offset=offset)
+    offset += rows * 8
+
+    columns = {}
+    for column in meta['columns']:
+        columns[column] = np.frombuffer(data, dtype='<f8', count=rows, offset=offset).copy()
+        offset += rows * 8
+
+    df = pd.DataFrame(columns, columns=meta['columns'], index=pd.DatetimeIndex(index.astype('datetime64[ns]')))
+    df.index.name = meta['index_name']
+    return df
+
+
+class CompressedFileSystemCache:
+    """
+    A cache storing each entry as a compressed, versioned and checksummed file in a directory, within a total
+    byte budget. It has the same get/set interface as the werkzeug caches.
+    """
+    def __init__(self, cache_dir, default_timeout=300, max_bytes=64 * 1024 * 1024, codec='zlib'):
+        """
+        Constructor for CompressedFileSystemCache.
+
+        :param cache_dir: The directory to store the cache files in, created if it doesn't exist
+        :param default_timeout: The number of seconds an entry stays valid if set is not given a timeout (0 = forever)
+        :param max_bytes: The budget for the total size of the cache files
+        :param codec: The name of the codec in CODECS used to compress new entries
+        """
+        if codec not in CODECS:
+            raise ValueError('unknown codec {0!r}'.format(codec))
+
+        self.cache_dir = cache_dir
+        self.default_timeout = default_timeout
+        self.max_bytes = max_bytes
+        self.codec = CODECS[codec]
+
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._compacting = False
+        self._size = sum(size for _, size, _ in self._list_files())
+
+        if self._size > self.max_bytes:
+            self.compact_in_background()
+
+    def _path(self, key):
+        """
+        :param key: The cache key
+        :return: The path of the file storing key
+        """
+        return os.path.join(self.cache_dir, hashlib.md5(key.encode('utf-8')).hexdigest() + FILE_EXTENSION)
+
+    def _list_files(self):
+        """
+        Lists every file in the cache directory, including temporary files and files of older cache formats.
+
+        :return: List of (path, size, last access time) tuples
+        """
+        files = []
+        for entry in os.scandir(self.cache_dir):
+            try:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+            except OSError:
+                continue  # removed by another thread or process
+            files.append((entry.path, stat.st_size, stat.st_mtime))
+        return files
+
+    def _remove(self, path):
+        """
+        Removes a cache file, keeping the tracked cache size up to date.
+
+        :param path: The path of the file to remove
+        :return: None
+        """
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            # already removed, or in use (e.g. open in another process on Windows), compaction retries it later
+            return
+        with self._lock:
+            self._size -= size
+
+    def _read(self, path):
+        """
+        Reads and validates a cache file.
+
+        :param path: The path of the file
+        :return: The stored value, or None if the entry has expired
+        :raises ValueError: if the file is corrupt or was written by another format version or unknown codec
+        """
+        with open(path, 'rb') as file:
+            header = file.read(HEADER.size)
+            expiry = self._check_header(header)[1]
+
+            # the expiry is in the header, so expired entries are never decompressed
+            if expiry and expiry < time.time():
+                return None
+
+            payload = file.read()
+
+        codec_id, _, length, checksum = self._check_header(header)
+        if len(payload) != length or zlib.crc32(payload) != checksum:
+            raise ValueError('checksum mismatch')
+
+        for codec in CODECS.values():
+            if codec.codec_id == codec_id:
+                break
+        else:
+            raise ValueError('unknown codec id {0}'.format(codec_id))
+
+        return decode_value(codec.decompress(payload))
+
+    @staticmethod
+    def _check_header(header):
+        """
+        Validates the header of a cache file.
+
+        :param header: The first HEADER.size bytes of the file
+        :return: Tuple (codec id, expiry, payload length, payload checksum)
+        :raises ValueError: if the header is truncated or of another format version
+        """
+        if len(header) < HEADER.size:
+            raise ValueError('truncated header')
+
+        magic, version, codec_id, expiry, length, checksum = HEADER.unpack(header)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError('unknown cache file format')
+
+        return codec_id, expiry, length, checksum
+
+    def get(self, key):
+        """
+        Gets the value stored for key.
+
+        :param key: The cache key
+        :return: The cached value, or None if there is no valid entry for key
+        """
+        path = self._path(key)
+        try:
+            value = self._read(path)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # corrupt, truncated or outdated entry, treat as a miss and remove it
+            profiling.count('cache.corrupt')
+            self._remove(path)
+            return None
+
+        if value is None:
+            # expired entry
+            self._remove(path)
+            return None
+
+        # mark the entry as recently used for compaction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        return value
+
+    def set(self, key, value, timeout=None):
+        """
+        Stores value for key, replacing any existing entry.
+
+        :param key: The cache key
+        :param value: The value to store (DataFrame or JSON serializable value)
+        :param timeout: The number of seconds the entry stays valid, defaults to default_timeout (0 = forever)
+        :return: Boolean, True if the entry was stored, False if it couldn't be written (like the werkzeug caches)
+        """
+        if timeout is None:
+            timeout = self.default_timeout
+        expiry = time.time() + timeout if timeout else 0
+
+        payload = self.codec.compress(encode_value(value))
+        header = HEADER.pack(MAGIC, FORMAT_VERSION, self.codec.codec_id, expiry, len(payload), zlib.crc32(payload))
+
+        path = self._path(key)
+        try:
+            old_size = os.path.getsize(path)
+        except OSError:
+            old_size = 0
+
+        # write to a temporary file and then rename over any existing entry, so readers never see a partially
+        # written entry or a miss while it is replaced
+        try:
+            fd, tmp_path = tempfile.mkstemp(suffix=TMP_EXTENSION, dir=self.cache_dir)
+        except OSError:
+            profiling.count('cache.write_errors')
+            return False
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(header)
+                file.write(payload)
+            os.replace(tmp_path, path)
+        except OSError:
+            # e.g. disk full, or the entry is open in another process on Windows
+            profiling.count('cache.write_errors')
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass  # removed by compaction once stale
+            return False
+
+        size = len(header) + len(payload)
+        profiling.count('cache.bytes_written', size)
+        with self._lock:
+            self._size += size - old_size
+            over_budget = self._size > self.max_bytes
+
+        if over_budget:
+            self.compact_in_background()
+        return True
+
+    def delete(self, key):
+        """
+        Removes the entry for key, if there is one.
+
+        :param key: The cache key
+        :return: None
+        """
+        self._remove(self._path(key))
+
+    def clear(self):
+        """
+        Removes every entry of the cache.
+
+        :return: None
+        """
+        for path, _, _ in self._list_files():
+            self._remove(path)
+
+    def compact_in_background(self):
+        """
+        Starts compaction on a background thread, unless it is already running.
+
+        :return: None
+        """
+        with self._lock:
+            if self._compacting:
+                return
+            self._compacting = True
+
+        threading.Thread(target=self.compact, daemon=True).start()
+
+    def compact(self):
+        """
+        Removes stale temporary files, files that aren't valid entries of this cache format and expired entries,
+        and then the least recently used entries until the cache directory is within its budget.
+
+        :return: None
+        """
+        try:
+            with profiling.span('cache.compact'):
+                now = time.time()
+                files = []
+                for path, size, last_used in self._list_files():
+                    if path.endswith(TMP_EXTENSION):
+                        # an entry being written (possibly by another process) unless it is old
+                        if last_used < now - STALE_TMP_SECONDS:
+                            self._remove(path)
+                        else:
+                            files.append((now, path, size))  # counts against the budget, but never evicted
+                        continue
+
+                    if not path.endswith(FILE_EXTENSION):
+                        # e.g. pickles of the werkzeug cache used by older versions
+                        self._remove(path)
+                        continue
+
+                    try:
+                        with open(path, 'rb') as file:
+                            expiry = self._check_header(file.read(HEADER.size))[1]
+                    except FileNotFoundError:
+                        continue
+                    except (OSError, ValueError, struct.error):
+                        # corrupt or outdated entry
+                        self._remove(path)
+                        continue
+
+                    if expiry and expiry < now:
+                        self._remove(path)
+                        profiling.count('cache.evictions')
+                    else:
+                        files.append((last_used, path, size))
+
+                # recalculate the exact size, then remove the least recently used entries
+                with self._lock:
+                    self._size = sum(size for _, _, size in files)
+
+                target = self.max_bytes * COMPACTION_TARGET
+                for _, path, size in sorted(files):
+                    if self._size <= target:
+                        break
+                    if path.endswith(TMP_EXTENSION):
+                        continue
+                    self._remove(path)
+                    profiling.count('cache.evictions')
+        finally:
+            with self._lock:
+                self._compacting = False
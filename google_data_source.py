@@ -2,21 +2,94 @@
 This module contains the code for downloading stock data from the Google Finance hidden API.
 """
 import pandas as pd
+import numpy as np
 import urllib.request
-import datetime as dt
+from collections import Counter, OrderedDict
+from contextlib import nullcontext
+from urllib.parse import unquote
 
+import profiling
 
-def get_google_data_for_stock(symbol, exchange, interval_seconds=86400, period='1d'):
+# the root of the URL of the Google Finance getprices API
+URL_ROOT = 'http://www.google.com/finance/getprices?'
+
+# the number of bytes of the response read at a time
+CHUNK_SIZE = 64 * 1024
+
+# the maximum number of rows parsed before they are converted to a DataFrame
+BATCH_SIZE = 10000
+
+# the column order of the rows, unless the response has a COLUMNS header
+DEFAULT_COLUMNS = ['DATE', 'CLOSE', 'HIGH', 'LOW', 'OPEN', 'VOLUME']
+
+# the columns of the returned DataFrames
+FRAME_COLUMNS = ['Close', 'High', 'Low', 'Open', 'Volume']
+
+
+def get_google_data_for_stock(symbol, exchange, interval_seconds=86400, period='1d', stats=None):
     """
     Downloads the stock data for the instrument denoted by (symbol, exchange)
 
+    The batches of iter_google_data_for_stock are copied into one preallocated array as they arrive, which is
+    grown with realloc when needed, so neither the whole response text nor a Python object per row is ever held
+    and the DataFrame is built on that array without a final concatenated copy.
+
     :param symbol: The Google Finance 'code' for the stock
     :param exchange: The Google Finance 'index' to which the stock belongs
     :param interval_seconds: The number of seconds in one candle/time interval
     :param period: The period of time for which we should have data.
-    :return: A pandas DataFrame containing the stock data and with a DateTimeIndex
+    :param stats: Optional dict to add the download statistics to, see iter_google_data_for_stock
+    :return: A pandas DataFrame containing the stock data and with a DateTimeIndex (in the exchange's local time)
+    :raises ValueError: if no data is returned for the stock
     """
-    url_root = 'http://www.google.com/finance/getprices?'
+    columns = None
+    values = np.empty((0, len(FRAME_COLUMNS)))
+    timestamps = np.empty(0, dtype=np.int64)
+    rows = 0
+
+    for batch in iter_google_data_for_stock(symbol, exchange, interval_seconds, period, stats=stats):
+        if columns is None:
+            columns = list(batch.columns)
+            values = np.empty((0, len(columns)))
+        n = len(batch)
+
+        # grow the arrays (doubling, so there are few reallocations), resizing in place where possible
+        if rows + n > len(timestamps):
+            capacity = max(2 * len(timestamps), rows + n)
+            values.resize((capacity, len(columns)), refcheck=False)
+            timestamps.resize(capacity, refcheck=False)
+
+        values[rows:rows + n] = batch[columns].values
+        timestamps[rows:rows + n] = batch.index.values.astype('datetime64[ns]').astype(np.int64)
+        rows += n
+
+    if not rows:
+        raise ValueError('no data returned for {0}:{1}'.format(symbol, exchange))
+
+    # release the unused capacity
+    values.resize((rows, len(columns)), refcheck=False)
+    timestamps.resize(rows, refcheck=False)
+
+    index = pd.DatetimeIndex(timestamps.view('datetime64[ns]'), name='ts')
+    return pd.DataFrame(values, index=index, columns=columns, copy=False)
+
+
+def iter_google_data_for_stock(symbol, exchange, interval_seconds=86400, period='1d', batch_size=BATCH_SIZE,
+                               stats=None):
+    """
+    Downloads the stock data for the instrument denoted by (symbol, exchange) as a stream of batches, for callers
+    that can process the data a batch at a time with memory use independent of the size of the download.
+
+    :param symbol: The Google Finance 'code' for the stock
+    :param exchange: The Google Finance 'index' to which the stock belongs
+    :param interval_seconds: The number of seconds in one candle/time interval
+    :param period: The period of time for which we should have data.
+    :param batch_size: The maximum number of rows in each batch
+    :param stats: Optional dict to add the number of bytes downloaded ('bytes') and lines skipped ('skipped') to,
+                  if not given the skipped lines are printed instead
+    :return: Generator of pandas DataFrames of at most batch_size rows each, see GetPricesParser.parse
+    """
+    url_root = URL_ROOT
     url_root += 'q=' + symbol
     url_root += '&x=' + exchange
     url_root += '&i=' + str(interval_seconds)
@@ -24,35 +97,202 @@ def get_google_data_for_stock(symbol, exchange, interval_seconds=86400, period='
     url_root += '&f=d,o,h,l,c,v'
     url_root += '&df=cpct'
 
-    print(url_root)
-
-    with urllib.request.urlopen(url_root) as response:
-        data = response.read().decode('ascii')
-
-    # print(data)
-    data = data.split('\n')
-
-    # actual data starts at index = 3
-    # first line contains full timestamp,
-    # every other line is offset of period from timestamp
-    parsd_data = []
-    anchor_stamp = ''
-    end = len(data)
-    for i in range(7, end):
-        c_data = data[i].split(',')
-        if 'a' in c_data[0]:
-            # first one record anchor timestamp
-            anchor_stamp = c_data[0].replace('a', '')
-            c_ts = int(anchor_stamp)
-        else:
-            try:
-                coffset = int(c_data[0])
-                c_ts = int(anchor_stamp) + (coffset * interval_seconds)
-                parsd_data.append((dt.datetime.fromtimestamp(float(c_ts)), float(c_data[1]), float(c_data[2]), float(c_data[3]), float(c_data[4]), float(c_data[5])))
-            except:
-                pass  # for time zone offsets thrown into data
-    df = pd.DataFrame(parsd_data)
-    df.columns = ['ts', 'Close', 'High', 'Low', 'Open', 'Volume']
-    df.index = df.ts
-    del df['ts']
-    return df
+    parser = GetPricesParser(interval_seconds, batch_size)
+
+    # time connecting and every read of the response as one 'fetch' span, parsing is timed separately as 'parse'
+    fetch_span = profiling.accumulating_span('fetch', symbol=symbol, period=period)
+    try:
+        with fetch_span:
+            response = urllib.request.urlopen(url_root)
+
+        with response:
+            # parse the response as it arrives, keeping only one chunk of text and one batch of rows in memory
+            for batch in parser.parse(read_chunks(response, fetch_span=fetch_span, stats=stats)):
+                profiling.count('parse.rows', len(batch))
+                yield batch
+    finally:
+        fetch_span.close()
+
+    if stats is not None:
+        stats['skipped'] = stats.get('skipped', 0) + sum(parser.skipped.values())
+    elif parser.skipped:
+        print('skipped {0} lines: {1}'.format(sum(parser.skipped.values()), dict(parser.skipped)))
+
+
+def read_chunks(response, chunk_size=CHUNK_SIZE, fetch_span=None, stats=None):
+    """
+    Generator reading a response in chunks.
+
+    :param response: The file-like response to read
+    :param chunk_size: The number of bytes to read at a time
+    :param fetch_span: Optional span (see profiling.accumulating_span) to time the reads with
+    :param stats: Optional dict to add the number of bytes read to (as 'bytes')
+    :return: Generator of bytes chunks
+    """
+    if fetch_span is None:
+        fetch_span = nullcontext()  # the reads aren't timed
+
+    while True:
+        with fetch_span:
+            chunk = response.read(chunk_size)
+        if not chunk:
+            return
+        profiling.count('fetch.bytes', len(chunk))
+        if stats is not None:
+            stats['bytes'] = stats.get('bytes', 0) + len(chunk)
+        yield chunk
+
+
+class GetPricesParser:
+    """
+    Streaming parser for the text returned by the getprices API.
+
+    The response is a few KEY=VALUE header lines (e.g. COLUMNS, INTERVAL and TIMEZONE_OFFSET) followed by
+    comma separated rows, where the first column is either an absolute unix timestamp prefixed with 'a' or a
+    number of intervals since the last absolute timestamp. Header lines may reappear between rows, e.g. a
+    TIMEZONE_OFFSET line when daylight saving time changes, and apply to the rows after them.
+
+    Lines that can't be parsed are skipped and counted by reason in skipped.
+    """
+    def __init__(self, interval_seconds=86400, batch_size=BATCH_SIZE):
+        """
+        Constructor for GetPricesParser.
+
+        :param interval_seconds: The number of seconds in one candle/time interval, unless the INTERVAL header says otherwise
+        :param batch_size: The maximum number of rows in each DataFrame yielded by parse
+        """
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+
+        self.columns = list(DEFAULT_COLUMNS)
+        self.timezone_offset = 0  # minutes from UTC
+        self.anchor = None  # the last absolute unix timestamp
+        self.skipped = Counter()
+
+    def parse(self, chunks):
+        """
+        Generator parsing the response from an iterable of bytes chunks.
+
+        :param chunks: Iterable of bytes
+        :return: Generator of pandas DataFrames of at most batch_size rows each, with a DateTimeIndex
+                 in the exchange's local time
+        """
+        # time the parsing of every chunk as one 'parse' span, like the reads of the download are one 'fetch' span
+        parse_span = profiling.accumulating_span('parse')
+        try:
+            batch = []
+            remainder = ''
+            for chunk in chunks:
+                ready = []
+                with parse_span:
+                    lines = (remainder + chunk.decode('ascii', errors='replace')).split('\n')
+                    remainder = lines.pop()  # the last line may continue in the next chunk
+
+                    for line in lines:
+                        row = self.parse_line(line)
+                        if row is not None:
+                            batch.append(row)
+                            if len(batch) >= self.batch_size:
+                                ready.append(self.to_frame(batch))
+                                batch = []
+
+                # yield outside of the span, so the time spent by the consumer isn't counted as parsing
+                for frame in ready:
+                    yield frame
+
+            with parse_span:
+                row = self.parse_line(remainder)
+                if row is not None:
+                    batch.append(row)
+                frame = self.to_frame(batch) if batch else None
+            if frame is not None:
+                yield frame
+        finally:
+            parse_span.close()
+
+    def parse_line(self, line):
+        """
+        Parses one line, updating the parser state for header lines.
+
+        :param line: The line of text
+        :return: Tuple of the timestamp (seconds, exchange local time) and column values for a row, otherwise None
+        """
+        line = line.strip()
+        if not line:
+            return None
+
+        # header lines, the first is url encoded (EXCHANGE%3DNASDAQ)
+        line = unquote(line)
+        if '=' in line:
+            self.parse_header(*line.split('=', 1))
+            return None
+
+        fields = line.split(',')
+        if len(fields) != len(self.columns):
+            self.skip('wrong_columns')
+            return None
+
+        try:
+            if fields[0].startswith('a'):
+                # absolute timestamp, later rows are offsets from it
+                self.anchor = int(fields[0][1:])
+                timestamp = self.anchor
+            elif self.anchor is None:
+                self.skip('no_anchor')
+                return None
+            else:
+                timestamp = self.anchor + int(fields[0]) * self.interval_seconds
+
+            values = tuple(float(field) for field in fields[1:])
+        except ValueError:
+            self.skip('malformed')
+            return None
+
+        return (timestamp + self.timezone_offset * 60,) + values
+
+    def skip(self, reason):
+        """
+        Records a skipped line.
+
+        :param reason: The reason the line was skipped, e.g. 'malformed'
+        :return: None
+        """
+        self.skipped[reason] += 1
+        profiling.count('parse.skipped.' + reason)
+
+    def parse_header(self, key, value):
+        """
+        Applies a KEY=VALUE header line to the parser state.
+
+        :param key: The header field name
+        :param value: The header field value
+        :return: None
+        """
+        try:
+            if key == 'COLUMNS':
+                self.columns = value.split(',')
+            elif key == 'INTERVAL':
+                self.interval_seconds = int(value)
+            elif key == 'TIMEZONE_OFFSET':
+                self.timezone_offset = int(value)
+        except ValueError:
+            self.skip('malformed_header')
+
+    def to_frame(self, batch):
+        """
+        Converts a batch of parsed rows to a DataFrame.
+
+        :param batch: List of tuples returned by parse_line
+        :return: pandas DataFrame with Close, High, Low, Open and Volume columns and a DateTimeIndex
+        """
+        values = np.array(batch, dtype=float)
+        timestamps = values[:, 0].astype(np.int64).astype('datetime64[s]')
+        index = pd.DatetimeIndex(timestamps.astype('datetime64[ns]'), name='ts')  # same unit as the cached frames
+
+        # map the columns given by the COLUMNS header to the DataFrame columns, in the usual order
+        positions = {name.upper(): position for position, name in enumerate(self.columns)}
+        data = OrderedDict(
+            (column, values[:, positions[column.upper()]])
+            for column in FRAME_COLUMNS if column.upper() in positions
+        )
+        return pd.DataFrame(data, index=index)
@@ -10,8 +10,9 @@ matplotlib.use("Qt5Agg")  # use the Qt5 Aggregator for plotting matplotlib graph
 
 from PyQt5.QtWidgets import *
 
-from plot import GraphPane
-from widgets import StockSelector, TimePeriodsChooser, PlotStockButton
+from plot import GraphPane, Dashboard
+from widgets import StockSelector, TimePeriodsChooser, PlotStockButton, StatsPanel, DashboardInputs, \
+    PlotDashboardButton
 
 
 class ConfigurationModel:
@@ -24,6 +25,8 @@ class ConfigurationModel:
         self.stock_2_code = ""
         self.stock_2_index = ""
         self.time_periods = []
+        self.dashboard_stocks = []  # list of 'CODE:INDEX' strings
+        self.dashboard_time_periods = []
 
     def load(self):
         """
@@ -40,6 +43,11 @@ class ConfigurationModel:
             self.stock_2_code = json_dict['stock_2']['code']
             self.stock_2_index = json_dict['stock_2']['index']
             self.time_periods = json_dict['time_periods']
+
+            # the dashboard section is optional, older config files don't have it
+            dashboard = json_dict.get('dashboard', {})
+            self.dashboard_stocks = dashboard.get('stocks', [])
+            self.dashboard_time_periods = dashboard.get('time_periods', [])
         except FileNotFoundError:
             print('no config file found')
 
@@ -58,7 +66,11 @@ class ConfigurationModel:
                 'code': self.stock_2_code,
                 'index': self.stock_2_index
             },
-            'time_periods': self.time_periods
+            'time_periods': self.time_periods,
+            'dashboard': {
+                'stocks': self.dashboard_stocks,
+                'time_periods': self.dashboard_time_periods
+            }
         }
         with open('config.json', 'w+') as file:
             json.dump(json_dict, file)  # serialize as json and save
@@ -92,7 +104,7 @@ class ApplicationWindow(QMainWindow):
     """
     Class representing the main application window that all other windows and widgets have as a parent.
     """
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, dashboard=False, **kwargs):
         """
         Constructor for ApplicationWindow.
 
@@ -100,10 +112,13 @@ class ApplicationWindow(QMainWindow):
         and then invokes init_ui to set up our application's widgets.
 
         :param args: positional arguments to pass to the QMainWindow constructor
+        :param dashboard: If True, show the multi-stock dashboard instead of the two stock comparison
         :param kwargs: keyword arguments to pass to the QMainWindow constructor
         """
         super().__init__(*args, **kwargs)
 
+        self.dashboard = dashboard
+
         # set the number of graphs the application will display
         self.n_graphs = 3
 
@@ -143,6 +158,29 @@ class ApplicationWindow(QMainWindow):
 
         # ==== APP LAYOUT SECTIONS HERE ====
 
+        if self.dashboard:
+            self.init_dashboard_layout(layout)
+        else:
+            self.init_comparison_layout(layout)
+
+        # add the instrumentation stats panel below the graphs (hidden while instrumentation is disabled)
+        layout.addLayout(StatsPanel())
+
+        # === END APP LAYOUT SECTIONS ====
+
+        # set the layout of the parent widget to the application layout we have created
+        mainWidget.setLayout(layout)
+
+        # set the app's central widget to said parent widget
+        self.setCentralWidget(mainWidget)
+
+    def init_comparison_layout(self, layout):
+        """
+        Adds the widgets for comparing two stocks over n_graphs time periods to layout.
+
+        :param layout: The main layout of the application
+        :return: None
+        """
         # Add stock choosers for stocks 1 and 2
         stock_1_chooser = StockSelector(1, self.model)
         stock_2_chooser = StockSelector(2, self.model)
@@ -164,13 +202,26 @@ class ApplicationWindow(QMainWindow):
         # add the graph pane collection, created above, to the layout
         layout.addLayout(graph_pane_collection)
 
-        # === END APP LAYOUT SECTIONS ====
+    def init_dashboard_layout(self, layout):
+        """
+        Adds the widgets for the dashboard of many stocks over many time periods to layout.
 
-        # set the layout of the parent widget to the application layout we have created
-        mainWidget.setLayout(layout)
+        :param layout: The main layout of the application
+        :return: None
+        """
+        # add the inputs for the watchlist and time periods
+        dashboard_inputs = DashboardInputs(self.model)
+        layout.addLayout(dashboard_inputs)
 
-        # set the app's central widget to said parent widget
-        self.setCentralWidget(mainWidget)
+        # create the dashboard (but don't add, we want this below the plot button defined below)
+        dashboard = Dashboard()
+
+        # create and add the plot button (which references the dashboard)
+        plot_dashboard_button = PlotDashboardButton(dashboard, dashboard_inputs)
+        layout.addWidget(plot_dashboard_button)
+
+        # add the dashboard, created above, to the layout
+        layout.addWidget(dashboard)
 
 
 if __name__ == '__main__':
@@ -179,8 +230,8 @@ if __name__ == '__main__':
     # create a QApplication
     app = QApplication(sys.argv)
 
-    # create an Application Window
-    a_Window = ApplicationWindow()
+    # create an Application Window (pass --dashboard on the command line for the multi-stock dashboard)
+    a_Window = ApplicationWindow(dashboard='--dashboard' in sys.argv)
 
     # enable one of the following:
     a_Window.show()
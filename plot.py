@@ -1,28 +1,25 @@
 """
 This module contains code useful for plotting the stock graphs and caching the datasets used to generate them.
 """
-import os.path
+from collections import OrderedDict
 
-from PyQt5.QtWidgets import QSizePolicy, QVBoxLayout, QHBoxLayout, QLabel
+from PyQt5.QtCore import Qt, pyqtSignal
+from PyQt5.QtGui import QImage, QPainter, QPixmap
+from PyQt5.QtWidgets import QSizePolicy, QVBoxLayout, QHBoxLayout, QLabel, QScrollArea, QWidget, QGridLayout
+import matplotlib.dates as mdates
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
 
-from werkzeug.contrib.cache import FileSystemCache
-
+import profiling
+from cache_config import FETCH_PERIOD, get_cache, get_cache_key
 from google_data_source import get_google_data_for_stock
+from analytics import AnalyticsIndex
+from pyramid import OHLCPyramid
 
-# get the full path of the directory of the application
-app_root = os.path.abspath(os.path.dirname(__file__))
-
-# set up the cache directory as the subdirectory 'cache'
-CACHE_DIR = os.path.join(app_root, 'cache')
-
-# set the expiry of each object in the cache to 1 day (24 hrs) as this is what one datapoint of the datasets represents,
-# so the data won't be out of date for at least a day after
-EXPIRY_SECONDS = 24 * 60 * 60  # HOURS * MINUTES * SECONDS
-
-# create the werkzeug cache object with the cache directory and expiry
-cache = FileSystemCache(CACHE_DIR, default_timeout=EXPIRY_SECONDS, threshold=100) # threshold = 100 -> after 100 items stored, cache begins deleting some even if not yet expired
+# the zoom pyramids and analytics indexes built for recently plotted series, kept in memory so each is only built once
+MAX_DERIVED = 64
+derived = OrderedDict()  # (kind, cache key) -> (series fingerprint, object), least recently used first
 
 
 def plot_stocks(graph_pane_collection, stock1, stock2, time_periods):
@@ -35,72 +32,195 @@ def plot_stocks(graph_pane_collection, stock1, stock2, time_periods):
     :param time_periods: a list of time periods to plot these stocks on
     :return: Boolean, True if successful, False otherwise
     """
-    data_frames_stock1 = []
-    data_frames_stock2 = []
+    # capture a cProfile of the whole plot (only when enabled)
+    with profiling.profile(), profiling.span('plot_stocks'):
+        return _plot_stocks(graph_pane_collection, stock1, stock2, time_periods)
 
-    # iterate through each time period
-    for tp in time_periods:
-        # determine the key in cache for stock 1
-        cache_key_stock1 = "{0}:{1}.{2}".format(
-            stock1.get('gf_code'),
-            stock1.get('gf_index'),
-            tp
-        )
-
-        # determine the key in cache for stock 2
-        cache_key_stock2 = "{0}:{1}.{2}".format(
-            stock2.get('gf_code'),
-            stock2.get('gf_index'),
-            tp
-        )
-
-        # check if there is anything in cache for stock 1 key
-        if cache.get(cache_key_stock1) is not None:
-            # if so, use it
-            data_frames_stock1.append(cache.get(cache_key_stock1))
-        else:
-            # fetch new data from google
-            try:
-                df_1 = get_google_data_for_stock(stock1.get('gf_code'), stock1.get('gf_index'), interval_seconds=86400, period=tp)
-                data_frames_stock1.append(df_1)
-                cache.set(cache_key_stock1, df_1)  # cache the new data
-            except ValueError:
-                # stock data invalid, error
-                return False
 
-        # check if there is anything in cache for stock 2 key
-        if cache.get(cache_key_stock2) is not None:
-            # if so, use it
-            data_frames_stock2.append(cache.get(cache_key_stock2))
-        else:
-            # fetch new data from google
-            try:
-                df_2 = get_google_data_for_stock(stock2.get('gf_code'), stock2.get('gf_index'), interval_seconds=86400, period=tp)
-                data_frames_stock2.append(df_2)
-                cache.set(cache_key_stock2, df_2)  # cache the new data
-            except ValueError:
-                # stock data invalid, error
-                return False
+def get_stock_data(stock, time_period):
+    """
+    Gets the data for stock over time_period, from the cache if possible and otherwise from Google Finance
+    (caching the newly downloaded data).
 
-    # iterate through each graph pane and draw the graph on each
-    for idx, pane in enumerate(graph_pane_collection.graphs):
-        # get the datafram for stock 1
-        df1 = data_frames_stock1[idx]
+    :param stock: The details of the stock (dict with 'gf_code' and 'gf_index')
+    :param time_period: The time period to get data for
+    :return: A pandas DataFrame containing the stock data
+    :raises ValueError: if the stock data is invalid
+    """
+    # determine the key in cache for the stock
+    cache_key = get_cache_key(stock.get('gf_code'), stock.get('gf_index'), time_period)
+
+    # check if there is anything in cache for the key
+    with profiling.span('cache.get', key=cache_key):
+        df = get_cache().get(cache_key)
+
+    if df is not None:
+        # if so, use it
+        profiling.count('cache.hits')
+        return df
+
+    profiling.count('cache.misses')
+
+    # fetch new data from google
+    df = get_google_data_for_stock(stock.get('gf_code'), stock.get('gf_index'), interval_seconds=86400, period=time_period)
+    with profiling.span('cache.set', key=cache_key):
+        get_cache().set(cache_key, df)  # cache the new data
+    return df
+
+
+def get_derived(kind, build, stock, time_period, df):
+    """
+    Gets an object derived from df, the data for stock over time_period, building it only if the series has changed.
+
+    :param kind: The name of the kind of object, e.g. 'pyramid'
+    :param build: Function taking df and returning the derived object
+    :param stock: The details of the stock (dict with 'gf_code' and 'gf_index')
+    :param time_period: The time period of the data
+    :param df: The data for stock and time_period
+    :return: The derived object
+    """
+    key = (kind, get_cache_key(stock.get('gf_code'), stock.get('gf_index'), time_period))
 
-        # extract the x and y values to a tuple
-        stock_1_data = (df1.index, df1.Close)
+    # the cached data is deserialized afresh every time, so identify the series by its length and last timestamp
+    fingerprint = (len(df), df.index[-1])
 
-        # get the datafram for stock 2
-        df2 = data_frames_stock2[idx]
+    entry = derived.get(key)
+    if entry is not None and entry[0] == fingerprint:
+        derived.move_to_end(key)  # mark as most recently used
+        return entry[1]
+
+    with profiling.span(kind + '.build', key=key[1]):
+        obj = build(df)
+    derived[key] = (fingerprint, obj)
+
+    # evict the least recently used objects beyond the budget
+    while len(derived) > MAX_DERIVED:
+        derived.popitem(last=False)
+
+    return obj
+
+
+def get_stock_pyramid(stock, time_period, df):
+    """
+    Gets the zoom pyramid of df, the data for stock over time_period.
+
+    :param stock: The details of the stock (dict with 'gf_code' and 'gf_index')
+    :param time_period: The time period of the data
+    :param df: The data for stock and time_period
+    :return: OHLCPyramid of df
+    """
+    return get_derived('pyramid', OHLCPyramid, stock, time_period, df)
+
+
+def get_stock_index(stock, time_period, df):
+    """
+    Gets the analytics index of df, the data for stock over time_period.
+
+    :param stock: The details of the stock (dict with 'gf_code' and 'gf_index')
+    :param time_period: The time period of the data
+    :param df: The data for stock and time_period
+    :return: AnalyticsIndex of df
+    """
+    return get_derived('index', AnalyticsIndex, stock, time_period, df)
+
+
+def get_stock_periods(stock, fetch_period, time_periods):
+    """
+    Gets the data and statistics of stock for each of time_periods.
+
+    Only fetch_period is fetched (or read from cache, where the refresh daemon keeps it warm), the time periods
+    are sliced from it and their statistics come from its analytics index, so choosing a different time period
+    doesn't need a new download.
+
+    :param stock: The details of the stock (dict with 'gf_code' and 'gf_index')
+    :param fetch_period: The time period to fetch, at least as long as each of time_periods
+    :param time_periods: a list of time periods
+    :return: Tuple (DataFrame, periods) of the fetched data and a list of (DataFrame, RangeStats) tuples,
+             one for each time period
+    :raises ValueError: if the stock data is invalid
+    """
+    df = get_stock_data(stock, fetch_period)
+    index = get_stock_index(stock, fetch_period, df)
+
+    periods = []
+    for tp in time_periods:
+        stats = index.period_stats(tp)
+        periods.append((df.loc[stats.start:stats.end], stats))
+    return df, periods
+
+
+def _plot_stocks(graph_pane_collection, stock1, stock2, time_periods):
+    """
+    Implementation of plot_stocks, see plot_stocks for details.
+    """
+    try:
+        full_df1, periods_stock1 = get_stock_periods(stock1, FETCH_PERIOD, time_periods)
+        full_df2, periods_stock2 = get_stock_periods(stock2, FETCH_PERIOD, time_periods)
+    except ValueError:
+        # stock data invalid, error
+        return False
+
+    # get the zoom pyramids of the whole fetched series, so every pane can zoom out to all the data
+    zoom_pyramids = (
+        get_stock_pyramid(stock1, FETCH_PERIOD, full_df1),
+        get_stock_pyramid(stock2, FETCH_PERIOD, full_df2)
+    )
 
-        # extract the x and y values to a tuple
-        stock_2_data = (df2.index, df2.Close)
+    # iterate through each graph pane and draw the graph on each
+    for idx, pane in enumerate(graph_pane_collection.graphs):
+        # get the statistics for stock 1 and stock 2, the lines are drawn from the zoom pyramids
+        _, stats1 = periods_stock1[idx]
+        _, stats2 = periods_stock2[idx]
 
         # set the time period associated with this graph pane
         pane.time_period = time_periods[idx]
 
         # draw the new graph data
-        pane.draw(stock_1_data, stock_2_data)
+        with profiling.span('render', period=time_periods[idx]):
+            pane.draw(None, None, zoom_pyramids, (stats1, stats2))
+
+    # return true if all went successfully
+    return True
+
+
+def plot_dashboard(dashboard, stocks, time_periods):
+    """
+    Plots a graph for every combination of stock and time period on the dashboard, one row per stock
+    and one column per time period. The panes of a stock without valid data show 'No data', the other
+    stocks are still plotted.
+
+    :param dashboard: The Dashboard to draw the new graphs on.
+    :param stocks: A list of stock details (dicts with 'gf_code' and 'gf_index')
+    :param time_periods: a list of time periods to plot each stock on
+    :return: Boolean, True (invalid stocks are shown on their own panes)
+    """
+    if not time_periods:
+        # nothing to plot, show an empty grid
+        dashboard.data_ready.emit([[] for _ in stocks])
+        return True
+
+    with profiling.profile(), profiling.span('plot_dashboard'):
+        grid = []
+        for stock in stocks:
+            try:
+                _, periods = get_stock_periods(stock, FETCH_PERIOD, time_periods)
+            except ValueError:
+                # stock data invalid, show it on the stock's row and carry on with the other stocks
+                grid.append([
+                    (None, "{0}:{1} {2}\nNo data".format(stock.get('gf_code'), stock.get('gf_index'), tp))
+                    for tp in time_periods
+                ])
+                continue
+
+            row = []
+            for tp, (df, stats) in zip(time_periods, periods):
+                title = "{0}:{1} {2} {3:+.2f}%".format(stock.get('gf_code'), stock.get('gf_index'), tp,
+                                                       stats.percentage_change)
+                row.append(([(df.index, df.Close)], title))
+            grid.append(row)
+
+        # hand the new data to the GUI thread, the panes are rendered when they are next painted
+        dashboard.data_ready.emit(grid)
 
     # return true if all went successfully
     return True
@@ -109,6 +229,9 @@ def plot_stocks(graph_pane_collection, stock1, stock2, time_periods):
 class GraphCanvas(FigureCanvas):
     """
     GraphCanvas can be used as a widget for a matplotlib graph.
+
+    When given zoom pyramids, the graph can be zoomed with the mouse wheel and panned by dragging, and each view
+    is drawn from the pyramid level with about one point per pixel of the visible range.
     """
     def __init__(self, parent=None, width=7, height=7, dpi=60):
         """
@@ -128,23 +251,58 @@ class GraphCanvas(FigureCanvas):
         FigureCanvas.setSizePolicy(self, QSizePolicy.Expanding, QSizePolicy.Expanding)
         FigureCanvas.updateGeometry(self)
 
-    def update_lines(self, line1, line2, title):
+        # the zoom pyramids of the plotted series and the line artists drawing them
+        self.pyramids = None
+        self.plotted_lines = []
+
+        # the x position (pixels) and x limits when a pan drag started, None when not dragging
+        self.pan_start = None
+
+        # register the handlers for zooming and panning
+        self.mpl_connect('scroll_event', self.on_scroll)
+        self.mpl_connect('button_press_event', self.on_press)
+        self.mpl_connect('motion_notify_event', self.on_motion)
+        self.mpl_connect('button_release_event', self.on_release)
+
+    def update_lines(self, line1, line2, title, pyramids=None, view=None):
         """
         Update the graph with new lines to draw, and a new title.
 
-        :param line1: The first series to draw.
-        :param line2: The second series to draw.
+        With pyramids, the lines are drawn from the pyramids and line1 and line2 are not used (pass None).
+
+        :param line1: The first series to draw, if there are no pyramids
+        :param line2: The second series to draw, if there are no pyramids
         :param title: The new title of the graph
+        :param pyramids: Optional OHLCPyramid(s) of the two series, enabling zoom and pan
+        :param view: Optional (start, end) datetimes of the range to show first, defaults to all of the pyramids
         :return: None
         """
+        self.pyramids = pyramids
+        self.pan_start = None
+
         # clear the axes
         self.axes.cla()
 
+        if pyramids is not None:
+            # draw the initial range from the pyramid level matching the width of the graph
+            if view is not None:
+                start, end = view
+            else:
+                start = min(pyramid.start() for pyramid in pyramids)
+                end = max(pyramid.end() for pyramid in pyramids)
+            line1, line2 = self.view_lines(start, end)
+
         # plot stock 1
-        self.axes.plot_date(line1[0], line1[1], xdate=True, ydate=False, linestyle='solid')
+        lines_1 = self.axes.plot_date(line1[0], line1[1], xdate=True, ydate=False, linestyle='solid')
 
         # plot stock 2
-        self.axes.plot_date(line2[0], line2[1], xdate=True, ydate=False, linestyle='solid')
+        lines_2 = self.axes.plot_date(line2[0], line2[1], xdate=True, ydate=False, linestyle='solid')
+
+        self.plotted_lines = lines_1 + lines_2
+
+        if pyramids is not None:
+            # the lines include a point either side of the range, keep those outside of the view
+            self.axes.set_xlim(mdates.date2num(start), mdates.date2num(end))
 
         # set the new graph titile
         self.axes.set_title(title)
@@ -153,7 +311,114 @@ class GraphCanvas(FigureCanvas):
         self.figure.autofmt_xdate()
 
         # draw the new graph
-        self.draw()
+        with profiling.span('render.canvas'):
+            self.draw()
+
+    def view_lines(self, start, end):
+        """
+        Gets the lines to draw for the range start to end from the zoom pyramids.
+
+        :param start: The start of the visible range (datetime)
+        :param end: The end of the visible range (datetime)
+        :return: List of (x, y) series, one per pyramid
+        """
+        # aim for about one point per pixel of the axes
+        max_points = max(int(self.axes.bbox.width), 2)
+
+        lines = []
+        for pyramid in self.pyramids:
+            _, level = pyramid.view(start, end, max_points)
+            lines.append((level.index, level.Close))
+        return lines
+
+    def set_view(self, x_min, x_max):
+        """
+        Shows the range x_min to x_max (matplotlib date numbers), clamped to the range of the data,
+        redrawing the lines from the matching pyramid levels.
+
+        :param x_min: The start of the range to show
+        :param x_max: The end of the range to show
+        :return: None
+        """
+        data_min = mdates.date2num(min(pyramid.start() for pyramid in self.pyramids))
+        data_max = mdates.date2num(max(pyramid.end() for pyramid in self.pyramids))
+
+        # don't zoom out beyond the data, or in beyond one hour
+        width = min(max(x_max - x_min, 1.0 / 24), data_max - data_min)
+        x_min = min(max(x_min, data_min), data_max - width)
+        x_max = x_min + width
+
+        # num2date gives timezone aware datetimes, the data is naive
+        start = mdates.num2date(x_min).replace(tzinfo=None)
+        end = mdates.num2date(x_max).replace(tzinfo=None)
+
+        with profiling.span('render.view'):
+            y_values = []
+            for artist, (x, y) in zip(self.plotted_lines, self.view_lines(start, end)):
+                artist.set_data(mdates.date2num(x.to_pydatetime()), y.values)
+                y_values.append(y.values)
+
+            self.axes.set_xlim(x_min, x_max)
+
+            # fit the y axis to the visible data
+            y_values = [values for values in y_values if len(values)]
+            if y_values:
+                y_min = min(values.min() for values in y_values)
+                y_max = max(values.max() for values in y_values)
+                margin = (y_max - y_min) * 0.05 or 1
+                self.axes.set_ylim(y_min - margin, y_max + margin)
+
+            self.draw_idle()
+
+    def on_scroll(self, event):
+        """
+        Handler for the mouse wheel, zooms in or out around the mouse position.
+
+        :param event: The matplotlib MouseEvent
+        :return: None
+        """
+        if self.pyramids is None or event.inaxes is not self.axes:
+            return
+
+        # zoom by 20% per wheel step, keeping the date under the mouse in place
+        scale = 0.8 if event.button == 'up' else 1.25
+        x_min, x_max = self.axes.get_xlim()
+        self.set_view(event.xdata - (event.xdata - x_min) * scale, event.xdata + (x_max - event.xdata) * scale)
+
+    def on_press(self, event):
+        """
+        Handler for a mouse button press, starts a pan drag.
+
+        :param event: The matplotlib MouseEvent
+        :return: None
+        """
+        if self.pyramids is not None and event.inaxes is self.axes and event.button == 1:
+            self.pan_start = (event.x, self.axes.get_xlim())
+
+    def on_motion(self, event):
+        """
+        Handler for mouse movement, pans the graph while dragging.
+
+        :param event: The matplotlib MouseEvent
+        :return: None
+        """
+        if self.pan_start is None:
+            return
+
+        start_x, (x_min, x_max) = self.pan_start
+
+        # convert the distance dragged from pixels to date numbers
+        shift = (event.x - start_x) * (x_max - x_min) / self.axes.bbox.width
+        self.set_view(x_min - shift, x_max - shift)
+
+    def on_release(self, event):
+        """
+        Handler for a mouse button release, ends a pan drag.
+
+        :param event: The matplotlib MouseEvent
+        :return: None
+        """
+        self.pan_start = None
 
 
 class GraphPane(QVBoxLayout):
@@ -208,35 +473,48 @@ class GraphPane(QVBoxLayout):
         self.graph_canvas = GraphCanvas()
         self.addWidget(self.graph_canvas)
 
-    def draw(self, line1, line2):
+    def draw(self, line1, line2, pyramids=None, stats=None):
         """
         Updates the GraphPane with the new lines line1 and line2
         and calculates difference in open and close for each stock
         and then decided which is best and displays this information on the relevant output labels
 
-        :param line1: The line data for stock 1
-        :param line2: The line data for stock 2
+        :param line1: The line data for stock 1, not used (may be None) when pyramids and stats are given
+        :param line2: The line data for stock 2, not used (may be None) when pyramids and stats are given
+        :param pyramids: Optional OHLCPyramid(s) of the two stocks, the graph is drawn from them and can be zoomed
+                         and panned
+        :param stats: Optional RangeStats of the two stocks, to read the changes from instead of the lines
         :return: None
         """
 
+        # show the time period of the pane first, the pyramids allow zooming out to the rest of the data
+        view = None
+        if pyramids is not None and stats is not None:
+            view = (min(stats[0].start, stats[1].start), max(stats[0].end, stats[1].end))
+
         # draw the new lines
-        self.graph_canvas.update_lines(line1, line2, self.time_period)
+        self.graph_canvas.update_lines(line1, line2, self.time_period, pyramids, view)
 
-        # get the open and close values for stock 1
-        stock1_open = line1[1][0]
-        stock1_close = line1[1][-1]
+        if stats is not None:
+            # read the differences and percentage changes from the analytics index statistics
+            diff_1, diff_2 = stats[0].change, stats[1].change
+            per_change_1, per_change_2 = stats[0].percentage_change, stats[1].percentage_change
+        else:
+            # get the open and close values for stock 1
+            stock1_open = line1[1][0]
+            stock1_close = line1[1][-1]
 
-        # get the open and close values for stock 2
-        stock2_open = line2[1][0]
-        stock2_close = line2[1][-1]
+            # get the open and close values for stock 2
+            stock2_open = line2[1][0]
+            stock2_close = line2[1][-1]
 
-        # calculate the difference in open and close
-        diff_1 = stock1_close - stock1_open
-        diff_2 = stock2_close - stock2_open
+            # calculate the difference in open and close
+            diff_1 = stock1_close - stock1_open
+            diff_2 = stock2_close - stock2_open
 
-        # calculate the percentage change since open for both stocks
-        per_change_1 = (float(diff_1) / stock1_open) * 100
-        per_change_2 = (float(diff_2) / stock2_open) * 100
+            # calculate the percentage change since open for both stocks
+            per_change_1 = (float(diff_1) / stock1_open) * 100
+            per_change_2 = (float(diff_2) / stock2_open) * 100
 
         # determine which sign to use depending on if the percentage change is positive or negative
         sign_1 = '+' if per_change_1 >= 0 else '-'
@@ -269,3 +547,203 @@ class GraphPane(QVBoxLayout):
             # update the best output label to show stock 2 being better
             self.best_label.setText(self.model.stock_2_code)
             self.best_label.setStyleSheet('color: green')  # colour chosen by matplotlib for series 2
+
+
+class PaneRenderer:
+    """
+    PaneRenderer renders graphs to images with a single off-screen matplotlib Figure, so that the panes of a
+    Dashboard share one Figure instead of each having their own Figure and canvas.
+    """
+    def __init__(self, dpi=60):
+        """
+        Constructor for PaneRenderer.
+
+        :param dpi: DPI (Dots Per Inch) of the rendered graphs
+        """
+        self.figure = Figure(dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.axes = self.figure.add_subplot(111)
+
+    def render(self, lines, title, width, height):
+        """
+        Renders a graph of lines with the given title to an image.
+
+        :param lines: A list of (x, y) series to draw.
+        :param title: The title of the graph
+        :param width: The width of the image in pixels
+        :param height: The height of the image in pixels
+        :return: QImage of the rendered graph
+        """
+        # resize the shared figure to the size of the pane
+        dpi = self.figure.dpi
+        self.figure.set_size_inches(width / dpi, height / dpi)
+
+        # clear the axes and plot each series
+        self.axes.cla()
+        for line in lines:
+            self.axes.plot_date(line[0], line[1], xdate=True, ydate=False, linestyle='solid')
+
+        self.axes.set_title(title)
+
+        # format the x axis labels so that there are no overlaps
+        self.figure.autofmt_xdate()
+
+        # render the figure and copy the pixels out of the shared buffer
+        self.canvas.draw()
+        image_width, image_height = self.canvas.get_width_height()
+        image = QImage(bytes(self.canvas.buffer_rgba()), image_width, image_height, QImage.Format_RGBA8888)
+        return image.copy()
+
+
+class DashboardPane(QWidget):
+    """
+    DashboardPane is a lightweight placeholder widget for one graph of a Dashboard. It holds the graph data and
+    paints the Dashboard's cached bitmap of it, so only panes visible in the viewport are ever rendered.
+    """
+    def __init__(self, dashboard, width, height):
+        """
+        Constructor for DashboardPane.
+
+        :param dashboard: The Dashboard this pane belongs to.
+        :param width: The width of the pane in pixels
+        :param height: The height of the pane in pixels
+        """
+        super().__init__()
+        self.dashboard = dashboard
+        self.lines = None
+        self.title = ''
+
+        # incremented whenever the data changes, so bitmaps of the old data are no longer used
+        self.generation = 0
+
+        self.setFixedSize(width, height)
+
+    def set_data(self, lines, title):
+        """
+        Sets new graph data for the pane and schedules a repaint (which only happens if the pane is visible).
+
+        :param lines: A list of (x, y) series to draw, or None if there is no data
+        :param title: The title of the graph, shown on its own if there is no data
+        :return: None
+        """
+        self.lines = lines
+        self.title = title
+        self.generation += 1
+        self.update()
+
+    def paintEvent(self, event):
+        """
+        Qt paint handler, only called for panes that are (at least partly) visible in the viewport.
+
+        :param event: The QPaintEvent (not used)
+        :return: None
+        """
+        painter = QPainter(self)
+        if self.lines is None:
+            painter.drawText(self.rect(), Qt.AlignCenter, self.title or 'No data')
+        else:
+            painter.drawPixmap(0, 0, self.dashboard.pixmap_for(self))
+        painter.end()
+
+
+class Dashboard(QScrollArea):
+    """
+    Dashboard is a scrollable grid of graphs, one row per stock and one column per time period.
+
+    All panes are rendered by one shared PaneRenderer and the rendered bitmaps are kept in a bounded LRU cache,
+    so memory and redraw time depend on the number of visible panes rather than the total number of panes.
+    """
+
+    # emitted (from any thread) with a grid of (lines, title) tuples, applied to the panes on the GUI thread,
+    # lines is None for panes without data
+    data_ready = pyqtSignal(list)
+
+    def __init__(self, pane_width=320, pane_height=240, max_cached_bitmaps=48):
+        """
+        Constructor for Dashboard.
+
+        :param pane_width: The width of each pane in pixels
+        :param pane_height: The height of each pane in pixels
+        :param max_cached_bitmaps: The maximum number of rendered pane bitmaps to keep in memory
+        """
+        super().__init__()
+        self.pane_width = pane_width
+        self.pane_height = pane_height
+        self.max_cached_bitmaps = max_cached_bitmaps
+
+        self.renderer = PaneRenderer()
+        self.bitmaps = OrderedDict()  # (pane id, generation) -> QPixmap, least recently used first
+        self.panes = []  # list of rows of DashboardPane(s)
+
+        # create the widget holding the grid of panes inside the scroll area
+        self.grid_widget = QWidget()
+        self.grid = QGridLayout()
+        self.grid_widget.setLayout(self.grid)
+        self.setWidget(self.grid_widget)
+        self.setWidgetResizable(True)
+
+        self.data_ready.connect(self.set_grid)
+
+    def set_grid(self, grid):
+        """
+        Sets new data for every pane of the dashboard, creating or removing panes if the grid shape has changed.
+
+        :param grid: A list of rows, each a list of (lines, title) tuples
+        :return: None
+        """
+        shape = [len(row) for row in grid]
+        if shape != [len(row) for row in self.panes]:
+            self.build_panes(shape)
+
+        for pane_row, data_row in zip(self.panes, grid):
+            for pane, (lines, title) in zip(pane_row, data_row):
+                pane.set_data(lines, title)
+
+    def build_panes(self, shape):
+        """
+        Replaces the panes of the dashboard with new, empty panes.
+
+        :param shape: A list with the number of panes in each row
+        :return: None
+        """
+        # remove the old panes and their bitmaps
+        for row in self.panes:
+            for pane in row:
+                self.grid.removeWidget(pane)
+                pane.deleteLater()
+        self.bitmaps.clear()
+
+        self.panes = []
+        for row_idx, n_cols in enumerate(shape):
+            row = []
+            for col_idx in range(n_cols):
+                pane = DashboardPane(self, self.pane_width, self.pane_height)
+                self.grid.addWidget(pane, row_idx, col_idx)
+                row.append(pane)
+            self.panes.append(row)
+
+    def pixmap_for(self, pane):
+        """
+        Gets the rendered bitmap of pane from the cache, rendering it with the shared renderer if necessary.
+
+        :param pane: The DashboardPane to get the bitmap of.
+        :return: QPixmap of the pane's graph
+        """
+        key = (id(pane), pane.generation)
+        pixmap = self.bitmaps.get(key)
+        if pixmap is not None:
+            self.bitmaps.move_to_end(key)  # mark as most recently used
+            return pixmap
+
+        with profiling.span('render.pane', title=pane.title):
+            image = self.renderer.render(pane.lines, pane.title, pane.width(), pane.height())
+        profiling.count('render.panes')
+
+        pixmap = QPixmap.fromImage(image)
+        self.bitmaps[key] = pixmap
+
+        # evict the least recently used bitmaps beyond the budget
+        while len(self.bitmaps) > self.max_cached_bitmaps:
+            self.bitmaps.popitem(last=False)
+
+        return pixmap
@@ -0,0 +1,326 @@
+"""
+This module contains the instrumentation used to find out where the time goes when plotting stocks.
+
+It provides span timers for each stage of the plotting flow (fetch, parse, cache and render), counters
+(cache hits, bytes downloaded, rows parsed), an optional cProfile capture per plot, export of the recorded
+spans to Chrome trace JSON (open in chrome://tracing or https://ui.perfetto.dev) and rolling statistics for
+the in-app stats panel.
+
+Instrumentation is disabled by default and costs a single attribute check per call site while disabled.
+Set the STOCKS_PROFILE environment variable to 1 (spans and counters) or 'cprofile' (also capture a cProfile
+per plot) to enable it at start up, or call enable() at runtime.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from collections import deque
+
+# the maximum number of spans kept for the Chrome trace export, the oldest are dropped first
+MAX_TRACE_EVENTS = 100000
+
+# the number of most recent samples of each span used to calculate the rolling statistics
+ROLLING_WINDOW = 50
+
+
+class _NullSpan:
+    """
+    Span used while instrumentation is disabled, entering and exiting it does nothing.
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def close(self):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    """
+    Span timer that records its duration with the Recorder when it exits.
+    """
+    def __init__(self, recorder, name, args):
+        self.recorder = recorder
+        self.name = name
+        self.args = args
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end = time.perf_counter()
+        self.recorder.record_span(self.name, self.start, end, self.args)
+        return False
+
+
+class _AccumulatingSpan:
+    """
+    Span timer that can be entered several times and records the total time as one span when it is closed.
+    """
+    def __init__(self, recorder, name, args):
+        self.recorder = recorder
+        self.name = name
+        self.args = args
+        self.first_start = None
+        self.start = 0
+        self.total = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        if self.first_start is None:
+            self.first_start = self.start
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.total += time.perf_counter() - self.start
+        return False
+
+    def close(self):
+        if self.first_start is not None:
+            self.recorder.record_span(self.name, self.first_start, self.first_start + self.total, self.args)
+            self.first_start = None
+
+
+class Recorder:
+    """
+    Thread-safe store of the spans, counters and profiles recorded while instrumentation is enabled.
+    """
+    def __init__(self):
+        """
+        Constructor for Recorder.
+        """
+        self.enabled = False
+        self.cprofile = False
+
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()  # trace timestamps are relative to this point
+        self._events = deque(maxlen=MAX_TRACE_EVENTS)
+        self._durations = {}  # span name -> deque of the most recent durations (seconds)
+        self._totals = {}  # span name -> (count, total seconds) since the last reset
+        self._counters = {}
+        self.last_profile = ''
+
+    def span(self, name, **args):
+        """
+        Creates a span timer to be used as a context manager around a stage of the plotting flow.
+
+        :param name: The name of the stage, e.g. 'fetch' or 'cache.get'
+        :param args: Extra details to attach to the span in the Chrome trace (e.g. the stock symbol)
+        :return: A context manager timing the enclosed block
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, args)
+
+    def accumulating_span(self, name, **args):
+        """
+        Creates a span timer for a stage that is interleaved with others, e.g. the reads of a download that is
+        parsed as it arrives. It is used as a context manager around each part of the stage, and close() records
+        the total time of the parts as one span (starting when the first part started).
+
+        :param name: The name of the stage, e.g. 'fetch'
+        :param args: Extra details to attach to the span in the Chrome trace (e.g. the stock symbol)
+        :return: A context manager timing the enclosed blocks, with a close() method
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _AccumulatingSpan(self, name, args)
+
+    def count(self, name, value=1):
+        """
+        Increments the counter called name by value.
+
+        :param name: The name of the counter, e.g. 'cache.hits'
+        :param value: The amount to add to the counter
+        :return: None
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def record_span(self, name, start, end, args):
+        """
+        Records a completed span. Called by the span timers when they exit.
+
+        :param name: The name of the stage
+        :param start: The perf_counter value when the span started
+        :param end: The perf_counter value when the span ended
+        :param args: Extra details attached to the span
+        :return: None
+        """
+        duration = end - start
+        with self._lock:
+            self._events.append((name, start, duration, threading.get_ident(), args))
+
+            samples = self._durations.get(name)
+            if samples is None:
+                samples = self._durations[name] = deque(maxlen=ROLLING_WINDOW)
+            samples.append(duration)
+
+            count, total = self._totals.get(name, (0, 0.0))
+            self._totals[name] = (count + 1, total + duration)
+
+    def profile(self):
+        """
+        Creates a context manager that captures a cProfile of the enclosed block if cProfile capture is enabled.
+
+        The formatted statistics of the most recent capture are stored in last_profile.
+
+        :return: A context manager
+        """
+        if not (self.enabled and self.cprofile):
+            return _NULL_SPAN
+        return _ProfileCapture(self)
+
+    def stats(self):
+        """
+        Builds a snapshot of the rolling statistics of each span and the current counter values.
+
+        :return: Tuple (spans, counters) where spans maps each span name to a dict with the keys
+                 'count', 'total', 'mean', 'last' and 'max' (seconds, mean/last/max over the rolling window)
+        """
+        with self._lock:
+            spans = {}
+            for name, samples in self._durations.items():
+                count, total = self._totals[name]
+                spans[name] = {
+                    'count': count,
+                    'total': total,
+                    'mean': sum(samples) / len(samples),
+                    'last': samples[-1],
+                    'max': max(samples)
+                }
+            counters = dict(self._counters)
+        return spans, counters
+
+    def export_chrome_trace(self, path):
+        """
+        Writes the recorded spans and counters to path in the Chrome trace event JSON format.
+
+        :param path: The file path to write the trace to
+        :return: None
+        """
+        pid = os.getpid()
+        with self._lock:
+            trace_events = [
+                {
+                    'name': name,
+                    'cat': name.split('.')[0],
+                    'ph': 'X',
+                    'ts': (start - self._origin) * 1e6,  # microseconds
+                    'dur': duration * 1e6,
+                    'pid': pid,
+                    'tid': tid,
+                    'args': {key: str(value) for key, value in args.items()}
+                }
+                for name, start, duration, tid, args in self._events
+            ]
+            counters = dict(self._counters)
+
+        # add the final counter values as one counter event at the end of the trace
+        if trace_events:
+            end_ts = max(event['ts'] + event['dur'] for event in trace_events)
+            trace_events.append({'name': 'counters', 'ph': 'C', 'ts': end_ts, 'pid': pid, 'args': counters})
+
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, file)
+
+    def reset(self):
+        """
+        Discards all of the recorded spans, counters and profiles.
+
+        :return: None
+        """
+        with self._lock:
+            self._origin = time.perf_counter()
+            self._events.clear()
+            self._durations.clear()
+            self._totals.clear()
+            self._counters.clear()
+            self.last_profile = ''
+
+
+class _ProfileCapture:
+    """
+    Context manager that runs cProfile for the duration of the enclosed block.
+    """
+    def __init__(self, recorder):
+        self.recorder = recorder
+        self.profiler = cProfile.Profile()
+
+    def __enter__(self):
+        try:
+            self.profiler.enable()
+        except ValueError:
+            # another profiler is already active (e.g. a plot running on another thread), skip this capture
+            self.profiler = None
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.profiler is None:
+            return False
+        self.profiler.disable()
+
+        # format the 25 most expensive functions by cumulative time
+        output = io.StringIO()
+        pstats.Stats(self.profiler, stream=output).sort_stats('cumulative').print_stats(25)
+        self.recorder.last_profile = output.getvalue()
+        return False
+
+
+# the recorder shared by the whole application
+recorder = Recorder()
+
+# module level shortcuts for the call sites
+span = recorder.span
+accumulating_span = recorder.accumulating_span
+count = recorder.count
+profile = recorder.profile
+stats = recorder.stats
+export_chrome_trace = recorder.export_chrome_trace
+reset = recorder.reset
+
+
+def enable(cprofile=False):
+    """
+    Enables instrumentation.
+
+    :param cprofile: If True, also capture a cProfile of each plot
+    :return: None
+    """
+    recorder.enabled = True
+    recorder.cprofile = cprofile
+
+
+def disable():
+    """
+    Disables instrumentation. Anything already recorded is kept until reset() is called.
+
+    :return: None
+    """
+    recorder.enabled = False
+    recorder.cprofile = False
+
+
+def is_enabled():
+    """
+    :return: Boolean, True if instrumentation is enabled
+    """
+    return recorder.enabled
+
+
+# enable instrumentation at start up if requested by the environment
+_env_setting = os.environ.get('STOCKS_PROFILE', '').strip().lower()
+if _env_setting and _env_setting not in ('0', 'false', 'no', 'off'):
+    enable(cprofile=_env_setting == 'cprofile')
@@ -0,0 +1,121 @@
+"""
+This module contains a multi-resolution pyramid of pre-aggregated OHLC data, used to serve zoomed and panned
+views of a stock graph at a resolution matching the visible range.
+"""
+import numpy as np
+import pandas as pd
+
+# how each column is combined when aggregating rows into a coarser candle
+OHLC_AGGREGATION = {
+    'Open': 'first',
+    'High': 'max',
+    'Low': 'min',
+    'Close': 'last',
+    'Volume': 'sum'
+}
+
+# the coarser levels that may be built on top of the raw data, finest first, with the length of one candle.
+# offset objects rather than aliases, as the aliases ('H', 'M', 'Q', 'A') differ between pandas versions
+INTRADAY_LEVELS = [
+    (pd.offsets.Minute(5), pd.Timedelta(minutes=5)),
+    (pd.offsets.Minute(15), pd.Timedelta(minutes=15)),
+    (pd.offsets.Minute(30), pd.Timedelta(minutes=30)),
+    (pd.offsets.Hour(), pd.Timedelta(hours=1)),
+]
+DAILY_LEVELS = [
+    (pd.offsets.Day(), pd.Timedelta(days=1)),
+    (pd.offsets.Week(), pd.Timedelta(weeks=1)),
+    (pd.offsets.MonthEnd(), pd.Timedelta(days=30)),
+    (pd.offsets.QuarterEnd(), pd.Timedelta(days=91)),
+    (pd.offsets.YearEnd(), pd.Timedelta(days=365)),
+]
+
+
+class OHLCPyramid:
+    """
+    A stack of progressively coarser OHLC aggregates of one series (the raw data, then e.g. weekly, monthly,
+    quarterly and yearly candles, with intraday levels when the raw data is intraday), built once so that any
+    view of the series can be drawn from the level with about one candle per pixel.
+    """
+    def __init__(self, df):
+        """
+        Constructor for OHLCPyramid. Builds every level of the pyramid from df.
+
+        :param df: A pandas DataFrame with Open, High, Low, Close and Volume columns and a sorted DateTimeIndex
+        """
+        self.levels = [('raw', df)]
+
+        # determine the spacing of the raw data, only levels coarser than that are worth building
+        if len(df) > 1:
+            spacing = pd.Series(df.index).diff().median()
+        else:
+            spacing = pd.Timedelta(days=1)
+
+        for rule, length in INTRADAY_LEVELS + DAILY_LEVELS:
+            if length <= spacing:
+                continue
+
+            level = self.aggregate(self.levels[-1][1], rule)
+
+            # stop once aggregating no longer reduces the number of rows meaningfully
+            if len(level) >= len(self.levels[-1][1]) * 0.9:
+                continue
+            self.levels.append((rule, level))
+
+            if len(level) <= 1:
+                break
+
+        # keep the timestamps of each level as int64 nanoseconds for fast range lookups
+        self.positions = [level.index.values.astype('datetime64[ns]').astype(np.int64) for _, level in self.levels]
+
+    @staticmethod
+    def aggregate(df, rule):
+        """
+        Aggregates df into candles of the given pandas offset rule.
+
+        Each candle is timestamped with the time of the last row it contains, so candles never lie beyond the data.
+
+        :param df: A pandas DataFrame with OHLCV columns and a DateTimeIndex
+        :param rule: A pandas offset, e.g. pd.offsets.Week()
+        :return: A pandas DataFrame of the aggregated candles
+        """
+        aggregation = {column: how for column, how in OHLC_AGGREGATION.items() if column in df.columns}
+        aggregation['ts'] = 'last'
+
+        level = df.assign(ts=df.index).resample(rule).agg(aggregation).dropna()
+        level.index = pd.DatetimeIndex(level.pop('ts'))
+        return level
+
+    def view(self, start, end, max_points):
+        """
+        Gets the rows of the finest level that shows the range start to end with at most max_points rows.
+
+        One row either side of the range is included, so lines drawn from the result reach the edges of the view.
+
+        :param start: The start of the visible range (datetime)
+        :param end: The end of the visible range (datetime)
+        :param max_points: The maximum number of rows wanted, usually the pixel width of the graph
+        :return: Tuple (rule, DataFrame) of the chosen level's offset ('raw' for the raw data) and its rows in the range
+        """
+        start_ns = pd.Timestamp(start).value
+        end_ns = pd.Timestamp(end).value
+
+        for (rule, level), positions in zip(self.levels, self.positions):
+            left = positions.searchsorted(start_ns, side='left')
+            right = positions.searchsorted(end_ns, side='right')
+            if right - left <= max_points:
+                break
+
+        return rule, level.iloc[max(left - 1, 0):right + 1]
+
+    def start(self):
+        """
+        :return: The timestamp of the first row of the series
+        """
+        return self.levels[0][1].index[0]
+
+    def end(self):
+        """
+        :return: The timestamp of the last row of the series
+        """
+        return self.levels[0][1].index[-1]
@@ -0,0 +1,337 @@
+"""
+Standalone daemon that keeps the stock data cache warm for a large watchlist, so the application mostly reads
+from cache when plotting.
+
+The watchlist is a text file with one CODE:INDEX stock per line (blank lines and lines starting with # are
+ignored). It is sharded across worker processes, each downloading the stocks in its shard whose FETCH_PERIOD
+entry (the one the application slices every time period from) is missing or expired in the cache. Requests are
+rate limited per host, progress is checkpointed so an interrupted run resumes where it stopped, and throughput
+is reported as the run progresses.
+
+The cache must be large enough for the whole watchlist, or the run evicts its own earlier entries. Set the
+STOCKS_CACHE_MAX_BYTES environment variable (used by both the daemon and the application) or pass --max-bytes.
+
+Usage:
+    python refresh_daemon.py watchlist.txt --workers 4 --rate 2
+"""
+import argparse
+import json
+import os
+import queue
+import sys
+import time
+import zlib
+from multiprocessing import Process, Queue
+from urllib.parse import urlsplit
+
+from cache_config import EXPIRY_SECONDS, FETCH_PERIOD, MAX_CACHE_BYTES, app_root, create_cache, get_cache_key
+from data_cache import COMPACTION_TARGET
+from google_data_source import URL_ROOT, get_google_data_for_stock
+
+# the default file progress is checkpointed to
+CHECKPOINT_FILE = os.path.join(app_root, 'refresh.checkpoint')
+
+# the number of seconds between throughput reports
+REPORT_INTERVAL = 10
+
+# the approximate size in the cache of the FETCH_PERIOD daily data of one stock, used to check the cache budget
+ENTRY_BYTES = 36 * 1000
+
+# the number of entries each worker writes between compactions. Each worker only tracks its own writes, so it
+# compacts regularly to check the real size of the cache directory shared by all of the workers
+COMPACT_EVERY = 50
+
+
+class RateLimiter:
+    """
+    Limits the rate of requests to each host by spacing them evenly.
+    """
+    def __init__(self, requests_per_second):
+        """
+        Constructor for RateLimiter.
+
+        :param requests_per_second: The maximum number of requests per second to any one host
+        """
+        self.interval = 1.0 / requests_per_second
+        self.next_allowed = {}  # host -> the earliest time of the next request
+
+    def wait(self, host):
+        """
+        Blocks until a request to host is allowed.
+
+        :param host: The host name
+        :return: None
+        """
+        now = time.monotonic()
+        allowed = self.next_allowed.get(host, now)
+        if allowed > now:
+            time.sleep(allowed - now)
+        self.next_allowed[host] = max(allowed, now) + self.interval
+
+
+def load_watchlist(path):
+    """
+    Loads the watchlist file.
+
+    :param path: The path of the watchlist file
+    :return: List of (code, index) tuples
+    """
+    stocks = []
+    with open(path, 'r') as file:
+        for line in file:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            code, _, index = line.partition(':')
+            stocks.append((code.strip(), index.strip()))
+    return stocks
+
+
+def load_checkpoint(path):
+    """
+    Loads the tasks completed by a previous, interrupted run.
+
+    Entries older than the cache expiry are ignored, as the data they refreshed has expired since. Failed tasks
+    are never treated as completed, so they are retried.
+
+    :param path: The path of the checkpoint file
+    :return: Set of (code, index, time_period) tuples
+    """
+    oldest = time.time() - EXPIRY_SECONDS
+    completed = set()
+    try:
+        with open(path, 'r') as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # partially written last line of an interrupted run
+                if entry['status'] != 'failed' and entry.get('time', 0) >= oldest:
+                    completed.add((entry['code'], entry['index'], entry['period']))
+    except FileNotFoundError:
+        pass
+    return completed
+
+
+def shard_tasks(tasks, n_shards):
+    """
+    Splits the tasks into shards by a stable hash of the stock, so a stock is always refreshed by the same worker.
+
+    :param tasks: List of (code, index, time_period) tuples
+    :param n_shards: The number of shards
+    :return: List of n_shards lists of tasks
+    """
+    shards = [[] for _ in range(n_shards)]
+    for task in tasks:
+        shard_no = zlib.crc32('{0}:{1}'.format(task[0], task[1]).encode('utf-8')) % n_shards
+        shards[shard_no].append(task)
+    return shards
+
+
+def refresh_shard(shard_no, tasks, requests_per_second, max_bytes, results):
+    """
+    Worker process body. Refreshes each task of the shard that is missing or expired in the cache and reports
+    the outcome of every task on the results queue, followed by a None sentinel.
+
+    :param shard_no: The number of the shard
+    :param tasks: List of (code, index, time_period) tuples
+    :param requests_per_second: This worker's share of the per host request rate
+    :param max_bytes: The budget for the total size of the cache on disk
+    :param results: multiprocessing Queue to report the outcomes on
+    :return: None
+    """
+    host = urlsplit(URL_ROOT).netloc
+    limiter = RateLimiter(requests_per_second)
+
+    # create this worker's own cache object, rather than sharing (or inheriting through fork) another process's
+    # tracked size, lock and compaction state
+    cache = create_cache(max_bytes)
+    writes = 0
+
+    for code, index, time_period in tasks:
+        cache_key = get_cache_key(code, index, time_period)
+        download_stats = {}
+        error = ''
+        try:
+            if cache.get(cache_key) is not None:
+                status = 'fresh'  # still valid in cache, nothing to do
+            else:
+                limiter.wait(host)
+
+                df = get_google_data_for_stock(code, index, interval_seconds=86400, period=time_period,
+                                               stats=download_stats)
+                cache.set(cache_key, df)
+
+                writes += 1
+                if writes % COMPACT_EVERY == 0:
+                    cache.compact()
+
+                status = 'fetched'
+        except Exception as exception:
+            # invalid stock, network error etc., report it and carry on with the rest of the shard
+            status = 'failed'
+            error = '{0}: {1}'.format(type(exception).__name__, exception)
+
+        results.put({
+            'shard': shard_no,
+            'code': code,
+            'index': index,
+            'period': time_period,
+            'status': status,
+            'bytes': download_stats.get('bytes', 0),
+            'skipped': download_stats.get('skipped', 0),
+            'error': error,
+            'time': time.time()
+        })
+
+    results.put(None)
+
+
+def report(started, totals, pending):
+    """
+    Prints the throughput of the run so far.
+
+    :param started: The time.monotonic() value when the run started
+    :param totals: Dict of the number of tasks per status, the total bytes downloaded and lines skipped
+    :param pending: The number of tasks left
+    :return: None
+    """
+    elapsed = max(time.monotonic() - started, 1e-9)
+    done = totals['fetched'] + totals['fresh'] + totals['failed']
+    print('{0} done ({1} fetched, {2} fresh, {3} failed), {4} left | {5:.2f} symbols/s | {6:.1f} KiB ({7:.1f} KiB/s)'
+          ' | {8} lines skipped'
+          .format(done, totals['fetched'], totals['fresh'], totals['failed'], pending, done / elapsed,
+                  totals['bytes'] / 1024, totals['bytes'] / 1024 / elapsed, totals['skipped']))
+    sys.stdout.flush()
+
+
+def run(watchlist_path, n_workers, requests_per_second, checkpoint_path, restart=False, max_bytes=MAX_CACHE_BYTES):
+    """
+    Refreshes the FETCH_PERIOD data of every stock in the watchlist.
+
+    :param watchlist_path: The path of the watchlist file
+    :param n_workers: The number of worker processes
+    :param requests_per_second: The maximum number of requests per second to each host, across all workers
+    :param checkpoint_path: The path of the checkpoint file
+    :param restart: If True, ignore the checkpoint of a previous run
+    :param max_bytes: The budget for the total size of the cache on disk
+    :return: The number of failed or unfinished tasks
+    """
+    if restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    watchlist = load_watchlist(watchlist_path)
+
+    # compaction trims the cache to a fraction of its budget, warn if the watchlist won't fit in that
+    needed = len(watchlist) * ENTRY_BYTES
+    if needed > max_bytes * COMPACTION_TARGET:
+        print('warning: {0} stocks need a cache budget of about {1:.0f} MiB, but it is {2:.0f} MiB, so entries will be '
+              'evicted during the run. Increase it with --max-bytes or STOCKS_CACHE_MAX_BYTES'
+              .format(len(watchlist), needed / COMPACTION_TARGET / 1024 / 1024, max_bytes / 1024 / 1024))
+
+    # build the task list, skipping anything completed by an interrupted previous run
+    completed = load_checkpoint(checkpoint_path)
+    tasks = [
+        (code, index, FETCH_PERIOD)
+        for code, index in watchlist
+        if (code, index, FETCH_PERIOD) not in completed
+    ]
+    if completed:
+        print('resuming, {0} tasks already completed'.format(len(completed)))
+    print('{0} tasks across {1} workers'.format(len(tasks), n_workers))
+
+    # start one worker per non-empty shard, splitting the rate limit between them
+    shards = [shard for shard in shard_tasks(tasks, n_workers) if shard]
+    results = Queue()
+    workers = [
+        Process(target=refresh_shard, args=(shard_no, shard, requests_per_second / len(shards), max_bytes, results),
+                daemon=True)
+        for shard_no, shard in enumerate(shards)
+    ]
+    for worker in workers:
+        worker.start()
+
+    totals = {'fetched': 0, 'fresh': 0, 'failed': 0, 'bytes': 0, 'skipped': 0}
+    pending = len(tasks)
+    started = last_report = time.monotonic()
+    running = len(workers)
+
+    try:
+        with open(checkpoint_path, 'a') as checkpoint:
+            while running:
+                try:
+                    result = results.get(timeout=REPORT_INTERVAL)
+                except queue.Empty:
+                    # stop waiting if every worker has died without finishing its shard
+                    if not any(worker.is_alive() for worker in workers):
+                        print('all workers exited unexpectedly')
+                        break
+                    continue
+
+                if result is None:
+                    running -= 1
+                    continue
+
+                pending -= 1
+                totals[result['status']] += 1
+                totals['bytes'] += result['bytes']
+                totals['skipped'] += result['skipped']
+                if result['error']:
+                    print('failed {0}:{1} {2}: {3}'.format(result['code'], result['index'], result['period'],
+                                                            result['error']))
+
+                # record the outcome so that an interrupted run can resume after it
+                checkpoint.write(json.dumps(result) + '\n')
+                checkpoint.flush()
+
+                if time.monotonic() - last_report >= REPORT_INTERVAL:
+                    report(started, totals, pending)
+                    last_report = time.monotonic()
+    except KeyboardInterrupt:
+        print('interrupted, run again to resume')
+        for worker in workers:
+            worker.terminate()
+        raise
+
+    for worker in workers:
+        worker.join()
+
+    report(started, totals, pending)
+
+    if pending:
+        # keep the checkpoint, so the next run resumes with the unfinished tasks
+        print('{0} tasks unfinished, run again to resume'.format(pending))
+    else:
+        # the run is complete, the next run starts from scratch (failed tasks are still missing from the cache,
+        # so they are picked up again then)
+        os.remove(checkpoint_path)
+
+    return totals['failed'] + pending
+
+
+def main():
+    """
+    Command line entry point of the refresh daemon.
+
+    :return: The exit status code
+    """
+    parser = argparse.ArgumentParser(description='Keeps the stock data cache warm for a watchlist.')
+    parser.add_argument('watchlist', help='file with one CODE:INDEX stock per line')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='number of worker processes')
+    parser.add_argument('--rate', type=float, default=2.0, help='maximum requests per second to each host')
+    parser.add_argument('--checkpoint', default=CHECKPOINT_FILE, help='file to checkpoint progress to')
+    parser.add_argument('--restart', action='store_true', help='ignore the checkpoint of an interrupted run')
+    parser.add_argument('--max-bytes', type=int, default=MAX_CACHE_BYTES,
+                        help='budget for the total size of the cache (the application compacts the cache to its own '
+                             'budget, set STOCKS_CACHE_MAX_BYTES to change both)')
+    args = parser.parse_args()
+
+    try:
+        failed = run(args.watchlist, max(args.workers, 1), args.rate, args.checkpoint, args.restart, args.max_bytes)
+    except KeyboardInterrupt:
+        return 130
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,7 @@
+"""
+pytest configuration, makes the application modules importable from the tests.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
@@ -0,0 +1,119 @@
+"""
+Tests for the compressed file system cache.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_cache import HEADER, CompressedFileSystemCache, decode_value, encode_value
+
+
+def make_frame(rows=5):
+    days = np.datetime64('2017-01-02') + np.arange(rows)
+    index = pd.DatetimeIndex(days.astype('datetime64[ns]'), name='ts')
+    return pd.DataFrame({
+        'Close': np.linspace(10, 20, rows),
+        'High': np.linspace(11, 21, rows),
+        'Low': np.linspace(9, 19, rows),
+        'Open': np.linspace(10, 20, rows),
+        'Volume': np.arange(rows) * 100.0
+    }, index=index, columns=['Close', 'High', 'Low', 'Open', 'Volume'])
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return CompressedFileSystemCache(str(tmp_path), default_timeout=60)
+
+
+def test_frame_round_trip():
+    df = make_frame()
+    pd.testing.assert_frame_equal(decode_value(encode_value(df)), df)
+
+
+def test_json_round_trip():
+    value = {'a': [1, 2.5, 'x']}
+    assert decode_value(encode_value(value)) == value
+
+
+@pytest.mark.parametrize('codec', ['none', 'zlib', 'lzma'])
+def test_set_and_get_frame(tmp_path, codec):
+    cache = CompressedFileSystemCache(str(tmp_path), codec=codec)
+    df = make_frame()
+    assert cache.set('AAPL:NASDAQ.7Y', df)
+    pd.testing.assert_frame_equal(cache.get('AAPL:NASDAQ.7Y'), df)
+
+
+def test_missing_entry_is_a_miss(cache):
+    assert cache.get('missing') is None
+
+
+def test_expired_entry_is_a_miss_and_removed(cache):
+    cache.set('key', make_frame(), timeout=-1)
+    assert cache.get('key') is None
+    assert not os.path.exists(cache._path('key'))
+
+
+def test_replacing_an_entry_keeps_the_size(cache):
+    cache.set('key', make_frame())
+    size = cache._size
+    cache.set('key', make_frame())
+    assert cache._size == size == os.path.getsize(cache._path('key'))
+
+
+def test_truncated_file_is_a_miss_and_removed(cache):
+    cache.set('key', make_frame())
+    path = cache._path('key')
+    with open(path, 'rb') as file:
+        data = file.read()
+
+    for length in (HEADER.size - 1, len(data) - 1):
+        with open(path, 'wb') as file:
+            file.write(data[:length])
+        assert cache.get('key') is None
+        assert not os.path.exists(path)
+
+
+def test_checksum_mismatch_is_a_miss_and_removed(cache):
+    cache.set('key', make_frame())
+    path = cache._path('key')
+    with open(path, 'r+b') as file:
+        file.seek(-1, os.SEEK_END)
+        last = file.read(1)
+        file.seek(-1, os.SEEK_END)
+        file.write(bytes([last[0] ^ 0xff]))
+
+    assert cache.get('key') is None
+    assert not os.path.exists(path)
+
+
+def test_compaction_removes_least_recently_used(tmp_path):
+    cache = CompressedFileSystemCache(str(tmp_path), codec='none')
+    for n in range(4):
+        cache.set('key{0}'.format(n), make_frame(100))
+        os.utime(cache._path('key{0}'.format(n)), (n, n))
+    entry_size = os.path.getsize(cache._path('key0'))
+
+    # room for two entries after compaction
+    cache.max_bytes = entry_size * 3
+    cache.compact()
+
+    assert [cache.get('key{0}'.format(n)) is None for n in range(4)] == [True, True, False, False]
+
+
+def test_compaction_removes_foreign_and_stale_temporary_files(tmp_path):
+    cache = CompressedFileSystemCache(str(tmp_path))
+    foreign = tmp_path / 'a1b2c3'
+    foreign.write_bytes(b'pickle of an old cache')
+    stale = tmp_path / 'old.tmp'
+    stale.write_bytes(b'partial entry')
+    os.utime(str(stale), (0, 0))
+    fresh = tmp_path / 'new.tmp'
+    fresh.write_bytes(b'entry being written')
+
+    cache.compact()
+
+    assert not foreign.exists()
+    assert not stale.exists()
+    assert fresh.exists()
@@ -0,0 +1,118 @@
+"""
+Tests for the streaming getprices parser and the download of stock data.
+"""
+import io
+import urllib.request
+
+import pandas as pd
+import pytest
+
+import google_data_source
+from google_data_source import GetPricesParser
+
+# a daily response with a daylight saving change (TIMEZONE_OFFSET) part way through
+RESPONSE = (
+    'EXCHANGE%3DNASDAQ\n'
+    'MARKET_OPEN_MINUTE=570\n'
+    'COLUMNS=DATE,CLOSE,HIGH,LOW,OPEN,VOLUME\n'
+    'INTERVAL=86400\n'
+    'TIMEZONE_OFFSET=-300\n'
+    'a1500000000,10,11,9,9.5,1000\n'
+    '1,10.5,11.5,9.5,10,2000\n'
+    'TIMEZONE_OFFSET=-240\n'
+    '2,11,12,10,10.5,3000\n'
+)
+
+
+def parse(text, chunk_size=None, batch_size=10000):
+    """
+    Parses text split into chunks of chunk_size bytes (all at once if None) and concatenates the batches.
+    """
+    data = text.encode('ascii')
+    chunk_size = chunk_size or len(data)
+    chunks = [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+
+    parser = GetPricesParser(batch_size=batch_size)
+    frames = list(parser.parse(chunks))
+    return parser, frames
+
+
+def test_parses_rows_and_headers():
+    parser, frames = parse(RESPONSE)
+    df = frames[0]
+
+    assert list(df.columns) == ['Close', 'High', 'Low', 'Open', 'Volume']
+    assert list(df.Close) == [10, 10.5, 11]
+    assert list(df.Volume) == [1000, 2000, 3000]
+    assert not parser.skipped
+
+
+def test_timezone_offset_applies_to_later_rows():
+    _, frames = parse(RESPONSE)
+    start = pd.Timestamp(1500000000, unit='s')
+
+    assert list(frames[0].index) == [
+        start - pd.Timedelta(minutes=300),
+        start + pd.Timedelta(days=1) - pd.Timedelta(minutes=300),
+        start + pd.Timedelta(days=2) - pd.Timedelta(minutes=240),
+    ]
+
+
+def test_chunk_boundaries_do_not_change_the_result():
+    _, expected = parse(RESPONSE)
+    for chunk_size in (1, 2, 3, 7, 16, 64):
+        _, frames = parse(RESPONSE, chunk_size)
+        pd.testing.assert_frame_equal(pd.concat(frames), expected[0])
+
+
+def test_last_line_without_newline():
+    _, frames = parse(RESPONSE.rstrip('\n'), chunk_size=5)
+    assert list(pd.concat(frames).Close) == [10, 10.5, 11]
+
+
+def test_batches():
+    _, frames = parse(RESPONSE, batch_size=2)
+    assert [len(frame) for frame in frames] == [2, 1]
+
+
+def test_skipped_lines_are_counted_by_reason():
+    text = (
+        'COLUMNS=DATE,CLOSE,HIGH,LOW,OPEN,VOLUME\n'
+        '1,10,11,9,9.5,1000\n'  # offset before any absolute timestamp
+        'a1500000000,10,11,9,9.5,1000\n'
+        '1,10,11\n'  # missing columns
+        '2,x,11,9,9.5,1000\n'  # not a number
+        '3,10,11,9,9.5,1000\n'
+        'INTERVAL=daily\n'
+    )
+    parser, frames = parse(text, chunk_size=4)
+
+    assert dict(parser.skipped) == {'no_anchor': 1, 'wrong_columns': 1, 'malformed': 1, 'malformed_header': 1}
+    assert len(pd.concat(frames)) == 2
+
+
+def test_columns_header_reorders_columns():
+    text = 'COLUMNS=DATE,OPEN,VOLUME,CLOSE,HIGH,LOW\na1500000000,9.5,1000,10,11,9\n'
+    _, frames = parse(text)
+
+    assert list(frames[0].columns) == ['Close', 'High', 'Low', 'Open', 'Volume']
+    assert frames[0].iloc[0].tolist() == [10, 11, 9, 9.5, 1000]
+
+
+def test_get_google_data_for_stock(monkeypatch):
+    body = (RESPONSE + 'bad line\n').encode('ascii')
+    monkeypatch.setattr(google_data_source, 'CHUNK_SIZE', 8)
+    monkeypatch.setattr(urllib.request, 'urlopen', lambda url: io.BytesIO(body))
+
+    stats = {}
+    df = google_data_source.get_google_data_for_stock('AAPL', 'NASDAQ', period='7d', stats=stats)
+
+    pd.testing.assert_frame_equal(df, parse(RESPONSE)[1][0])
+    assert stats == {'bytes': len(body), 'skipped': 1}
+
+
+def test_get_google_data_for_stock_without_data(monkeypatch):
+    monkeypatch.setattr(urllib.request, 'urlopen', lambda url: io.BytesIO(b'EXCHANGE%3DNASDAQ\n'))
+
+    with pytest.raises(ValueError):
+        google_data_source.get_google_data_for_stock('NOPE', 'NASDAQ', period='7d')
@@ -4,16 +4,13 @@ This module contains custom widgets for this application.
 from urllib.error import URLError
 from threading import Thread
 
-from PyQt5.QtWidgets import QHBoxLayout, QLabel, QLineEdit, QVBoxLayout, QComboBox, QPushButton, QMessageBox
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import QHBoxLayout, QLabel, QLineEdit, QVBoxLayout, QComboBox, QPushButton, QMessageBox, \
+    QFileDialog
 
-from plot import plot_stocks
-
-POSSIBLE_TIME_PERIODS = [
-    '3d', '4d', '5d', '6d',
-    '7d', '14d', '21d',
-    '1M', '2M', '3M', '4M', '5M', '6M', '7M', '8M', '9M', '10M', '11M',
-    '1Y', '2Y', '3Y', '4Y', '5Y', '6Y', '7Y'
-]
+import profiling
+from cache_config import POSSIBLE_TIME_PERIODS
+from plot import plot_stocks, plot_dashboard
 
 
 class StockSelector(QHBoxLayout):
@@ -267,25 +264,257 @@ class PlotStockButton(QPushButton):
         time_periods = self.time_periods_chooser.get_time_periods_list()
 
         # invoke the graph rendering
-        try:
-            success = plot_stocks(self.graph_pane_collection, stock_1, stock_2, time_periods)
+        render_with_error_messages(plot_stocks, self.graph_pane_collection, stock_1, stock_2, time_periods)
+
 
-            # handle erroneous inputs with a message box
-            if not success:
-                msg = QMessageBox()
-                msg.setIcon(QMessageBox.Warning)
+def render_with_error_messages(plot_function, *args):
+    """
+    Invokes a graph rendering function, showing invalid stocks and network errors as message box dialogs.
 
-                msg.setText("You have chosen invalid stocks.")
-                msg.setWindowTitle("Invalid Stocks")
-                msg.setStandardButtons(QMessageBox.Ok)
+    :param plot_function: The rendering function to call, returning False if the chosen stocks are invalid.
+    :param args: The positional arguments to pass to plot_function
+    :return: None
+    """
+    try:
+        success = plot_function(*args)
 
-                msg.exec_()
-        except URLError as error:
-            # no connection, display error message
+        # handle erroneous inputs with a message box
+        if not success:
             msg = QMessageBox()
-            msg.setIcon(QMessageBox.Critical)
-            msg.setWindowTitle("Network Error")
-            msg.setText("A network error occurred. Please ensure you are connected to the internet.")
-            msg.setInformativeText(str(error))
+            msg.setIcon(QMessageBox.Warning)
+
+            msg.setText("You have chosen invalid stocks.")
+            msg.setWindowTitle("Invalid Stocks")
             msg.setStandardButtons(QMessageBox.Ok)
+
             msg.exec_()
+    except URLError as error:
+        # no connection, display error message
+        msg = QMessageBox()
+        msg.setIcon(QMessageBox.Critical)
+        msg.setWindowTitle("Network Error")
+        msg.setText("A network error occurred. Please ensure you are connected to the internet.")
+        msg.setInformativeText(str(error))
+        msg.setStandardButtons(QMessageBox.Ok)
+        msg.exec_()
+
+
+class DashboardInputs(QVBoxLayout):
+    """
+    A grouping of widgets that allows the watchlist and time periods of the dashboard to be input.
+    """
+    def __init__(self, model):
+        """
+        Constructor for DashboardInputs.
+
+        :param model: The ConfigurationModel object to modify with changes.
+        """
+        super().__init__()
+        self.model = model
+
+        # create a layout, label and input for the watchlist of stocks
+        stocks_box = QHBoxLayout()
+        stocks_box.addWidget(QLabel('Stocks (CODE:INDEX, comma separated):'))
+        self.stocks_input = QLineEdit()
+        self.stocks_input.setText(', '.join(model.dashboard_stocks))
+        self.stocks_input.textChanged.connect(self.stocks_changed)
+        stocks_box.addWidget(self.stocks_input)
+        self.addLayout(stocks_box)
+
+        # create a layout, label and input for the time periods
+        periods_box = QHBoxLayout()
+        periods_box.addWidget(QLabel('Time Periods (comma separated):'))
+        self.periods_input = QLineEdit()
+        self.periods_input.setText(', '.join(model.dashboard_time_periods))
+        self.periods_input.textChanged.connect(self.periods_changed)
+        periods_box.addWidget(self.periods_input)
+        self.addLayout(periods_box)
+
+    def get_stocks(self):
+        """
+        Getter for the stocks in the watchlist input.
+
+        :return: List of stock details (dicts with 'gf_code' and 'gf_index')
+        """
+        stocks = []
+        for entry in split_list(self.stocks_input.text()):
+            code, _, index = entry.partition(':')
+            stocks.append({'gf_code': code.strip(), 'gf_index': index.strip()})
+        return stocks
+
+    def get_time_periods_list(self):
+        """
+        Getter for the time periods input, ignoring any that are not possible time periods.
+
+        :return: List of time periods
+        """
+        return [tp for tp in split_list(self.periods_input.text()) if tp in POSSIBLE_TIME_PERIODS]
+
+    def stocks_changed(self, new_text):
+        """
+        Event handler for a change in the watchlist input.
+
+        :param new_text: The new text value of the input.
+        :return: None
+        """
+        self.model.dashboard_stocks = split_list(new_text)
+        self.model.save()  # persists the changes
+
+    def periods_changed(self, new_text):
+        """
+        Event handler for a change in the time periods input.
+
+        :param new_text: The new text value of the input.
+        :return: None
+        """
+        self.model.dashboard_time_periods = split_list(new_text)
+        self.model.save()  # persists the changes
+
+
+def split_list(text):
+    """
+    Splits comma separated text into a list of its non-empty, stripped entries.
+
+    :param text: The comma separated text
+    :return: List of strings
+    """
+    return [entry.strip() for entry in text.split(',') if entry.strip()]
+
+
+class PlotDashboardButton(QPushButton):
+    """
+    Class for the Plot Dashboard button, that invokes the dashboard rendering flow.
+    """
+    def __init__(self, dashboard, dashboard_inputs):
+        """
+        Constructor for PlotDashboardButton with references to key components which must be read from.
+
+        :param dashboard: The Dashboard to write the graphs to.
+        :param dashboard_inputs: The DashboardInputs containing the watchlist and time periods.
+        """
+        super().__init__("Plot Dashboard")
+        self.dashboard = dashboard
+        self.dashboard_inputs = dashboard_inputs
+
+        # connect the button's click signal to the custom event handler 'on_click'
+        self.clicked.connect(self.on_click)
+
+    def on_click(self):
+        """
+        Event handler for the button being clicked. Invokes rendering of the dashboard on a background thread.
+
+        :return: None
+        """
+        t = Thread(target=self.render_new, daemon=True)
+        t.start()
+
+    def render_new(self):
+        stocks = self.dashboard_inputs.get_stocks()
+        time_periods = self.dashboard_inputs.get_time_periods_list()
+
+        # invoke the dashboard rendering
+        render_with_error_messages(plot_dashboard, self.dashboard, stocks, time_periods)
+
+
+class StatsPanel(QVBoxLayout):
+    """
+    A panel showing rolling timing statistics for each stage of the plotting flow and the instrumentation counters.
+    The panel is hidden while instrumentation is disabled, and shown once it is enabled (at start up or at runtime).
+    """
+    def __init__(self, refresh_ms=1000):
+        """
+        Constructor for StatsPanel.
+
+        :param refresh_ms: How often (in milliseconds) the statistics are refreshed.
+        """
+        super().__init__()
+
+        # add a title label for the panel
+        title = QLabel('STATS')
+        title.setStyleSheet('font-weight: bold')
+        self.addWidget(title)
+
+        # create the output label for the statistics, in a monospace font so the columns line up
+        self.stats_label = QLabel('')
+        self.stats_label.setStyleSheet('font-family: monospace')
+        self.addWidget(self.stats_label)
+
+        # create a row of buttons to export the trace, show the last profile and reset the statistics
+        buttons = QHBoxLayout()
+
+        export_button = QPushButton('Export Chrome Trace')
+        export_button.clicked.connect(self.export_trace)
+        buttons.addWidget(export_button)
+
+        profile_button = QPushButton('Show Last Profile')
+        profile_button.clicked.connect(self.show_last_profile)
+        buttons.addWidget(profile_button)
+
+        reset_button = QPushButton('Reset')
+        reset_button.clicked.connect(profiling.reset)
+        buttons.addWidget(reset_button)
+
+        self.addLayout(buttons)
+
+        # the widgets shown or hidden along with instrumentation
+        self.widgets = [title, self.stats_label, export_button, profile_button, reset_button]
+
+        # refresh the statistics periodically, the plotting flow runs on another thread
+        self.timer = QTimer()
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(refresh_ms)
+
+        self.refresh()
+
+    def refresh(self):
+        """
+        Updates the statistics label with the latest rolling statistics and counters, and shows the panel only
+        while instrumentation is enabled.
+
+        :return: None
+        """
+        enabled = profiling.is_enabled()
+        for widget in self.widgets:
+            widget.setVisible(enabled)
+        if not enabled:
+            return
+
+        spans, counters = profiling.stats()
+
+        lines = ['{0:<16}{1:>7}{2:>10}{3:>10}{4:>10}'.format('stage', 'count', 'last ms', 'mean ms', 'max ms')]
+        for name in sorted(spans):
+            span = spans[name]
+            lines.append('{0:<16}{1:>7}{2:>10.1f}{3:>10.1f}{4:>10.1f}'.format(
+                name, span['count'], span['last'] * 1000, span['mean'] * 1000, span['max'] * 1000
+            ))
+
+        for name in sorted(counters):
+            lines.append('{0:<16}{1:>7}'.format(name, counters[name]))
+
+        self.stats_label.setText('\n'.join(lines))
+
+    def export_trace(self):
+        """
+        Event handler for the export button. Asks for a file name and writes the Chrome trace JSON to it.
+
+        :return: None
+        """
+        path, _ = QFileDialog.getSaveFileName(None, 'Export Chrome Trace', 'trace.json', 'JSON (*.json)')
+        if path:
+            profiling.export_chrome_trace(path)
+
+    def show_last_profile(self):
+        """
+        Event handler for the profile button. Shows the cProfile statistics of the last plot in a message box.
+
+        :return: None
+        """
+        msg = QMessageBox()
+        msg.setWindowTitle("Last Plot Profile")
+        if profiling.recorder.last_profile:
+            msg.setText("cProfile of the last plot (top 25 by cumulative time).")
+            msg.setDetailedText(profiling.recorder.last_profile)
+        else:
+            msg.setText("No profile captured yet. Set STOCKS_PROFILE=cprofile to capture one per plot.")
+        msg.setStandardButtons(QMessageBox.Ok)
+        msg.exec_()